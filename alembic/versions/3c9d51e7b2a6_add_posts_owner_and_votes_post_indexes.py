@@ -0,0 +1,39 @@
+"""add posts owner and votes post indexes
+
+Revision ID: 3c9d51e7b2a6
+Revises: e58d2c7a9f13
+Create Date: 2026-10-18 20:14:27.540318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9d51e7b2a6'
+down_revision = 'e58d2c7a9f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Build the indexes without locking out writes, which Postgres cannot do in a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_posts_owner_id_id',
+            'posts',
+            ['owner_id', 'id'],
+            postgresql_concurrently=True
+            )
+        op.create_index(
+            'ix_votes_post_id_user_id',
+            'votes',
+            ['post_id', 'user_id'],
+            postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_votes_post_id_user_id', table_name='votes', postgresql_concurrently=True)
+        op.drop_index('ix_posts_owner_id_id', table_name='posts', postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""add posts created_at id index
+
+Revision ID: 5f2c8e1d7a43
+Revises: 87a0976fc224
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2c8e1d7a43'
+down_revision = '87a0976fc224'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Build the index without locking out writes, which Postgres cannot do in a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_posts_created_at_id',
+            'posts',
+            ['created_at', 'id'],
+            postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_posts_created_at_id', table_name='posts', postgresql_concurrently=True)
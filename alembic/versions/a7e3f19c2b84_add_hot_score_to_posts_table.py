@@ -0,0 +1,67 @@
+"""add hot score to posts table
+
+Revision ID: a7e3f19c2b84
+Revises: c41e9a0b6d58
+Create Date: 2026-10-18 14:22:05.871342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e3f19c2b84'
+down_revision = 'c41e9a0b6d58'
+branch_labels = None
+depends_on = None
+
+
+# Posts backfilled per transaction, so no batch holds the row locks of the whole table.
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('hot', postgresql.DOUBLE_PRECISION(), nullable=True))
+    op.alter_column(
+        'posts',
+        'hot',
+        server_default=sa.text("(extract(epoch from now()) - 1134028003) / 45000")
+        )
+
+    # Each statement commits on its own, so the backfill and the checks never hold a lock
+    # on posts for longer than one of them takes.
+    with op.get_context().autocommit_block():
+        max_id = op.get_bind().scalar(sa.text("SELECT max(id) FROM posts")) or 0
+
+        for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+            op.execute(
+                sa.text(
+                    "UPDATE posts SET hot = log(greatest(votes, 1)) "
+                    "+ (extract(epoch from created_at) - 1134028003) / 45000 "
+                    "WHERE id > :start AND id <= :end AND hot IS NULL"
+                    ).bindparams(start=start, end=start + BACKFILL_BATCH_SIZE)
+                )
+
+        # Validating a check only blocks writes briefly, and lets SET NOT NULL skip its scan.
+        op.execute(
+            "ALTER TABLE posts ADD CONSTRAINT ck_posts_hot_not_null "
+            "CHECK (hot IS NOT NULL) NOT VALID"
+            )
+        op.execute("ALTER TABLE posts VALIDATE CONSTRAINT ck_posts_hot_not_null")
+        op.alter_column('posts', 'hot', nullable=False)
+        op.drop_constraint('ck_posts_hot_not_null', 'posts', type_='check')
+
+        # Build the indexes without locking out writes, which Postgres cannot do in a transaction.
+        op.create_index('ix_posts_hot_id', 'posts', ['hot', 'id'], postgresql_concurrently=True)
+        op.create_index(
+            'ix_posts_votes_id', 'posts', ['votes', 'id'], postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_posts_votes_id', table_name='posts', postgresql_concurrently=True)
+        op.drop_index('ix_posts_hot_id', table_name='posts', postgresql_concurrently=True)
+
+    op.drop_column('posts', 'hot')
@@ -0,0 +1,47 @@
+"""add search vector to posts table
+
+Revision ID: c41e9a0b6d58
+Revises: 5f2c8e1d7a43
+Create Date: 2026-10-18 10:03:27.554120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e9a0b6d58'
+down_revision = '5f2c8e1d7a43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A stored generated column rewrites posts under an ACCESS EXCLUSIVE lock, so reads and
+    # writes wait for the whole rewrite: apply this revision in a maintenance window.
+    op.add_column(
+        'posts',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english', title || ' ' || content)", persisted=True)
+            )
+        )
+
+    # Build the index without locking out writes, which Postgres cannot do in a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_posts_search_vector',
+            'posts',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_posts_search_vector', table_name='posts', postgresql_concurrently=True)
+
+    op.drop_column('posts', 'search_vector')
@@ -0,0 +1,44 @@
+"""add user stats table
+
+Revision ID: e58d2c7a9f13
+Revises: a7e3f19c2b84
+Create Date: 2026-10-18 16:05:41.203917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e58d2c7a9f13'
+down_revision = 'a7e3f19c2b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('posts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('votes_received', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('votes_cast', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+        )
+    op.execute(
+        "INSERT INTO user_stats (user_id, posts, votes_received, votes_cast) "
+        "SELECT users.id, coalesce(p.posts, 0), coalesce(r.votes_received, 0), "
+        "coalesce(c.votes_cast, 0) FROM users "
+        "LEFT JOIN (SELECT owner_id, count(*) AS posts FROM posts GROUP BY owner_id) p "
+        "ON p.owner_id = users.id "
+        "LEFT JOIN (SELECT posts.owner_id, count(*) AS votes_received FROM votes "
+        "JOIN posts ON posts.id = votes.post_id GROUP BY posts.owner_id) r "
+        "ON r.owner_id = users.id "
+        "LEFT JOIN (SELECT user_id, count(*) AS votes_cast FROM votes GROUP BY user_id) c "
+        "ON c.user_id = users.id"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('user_stats')
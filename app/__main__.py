@@ -0,0 +1,127 @@
+from app.database.config import settings
+from app.database.database import SessionLocal
+from app.libs.counters import reconcile_vote_counts
+from app.libs.importer import import_rows
+from app.libs.ranking import rescore_posts
+from app.libs.server import serve
+from app.libs.stats import rebuild_stats
+from app.routers.schemas.schemas import ImportFormat, ImportKind
+
+from argparse import ArgumentParser, BooleanOptionalAction
+
+import os
+import sys
+
+
+def main() -> None:
+    """ Runs the maintenance or serving command given on the command line. """
+
+    parser = ArgumentParser(prog="python -m app")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    recount = commands.add_parser(
+        "recount-votes", help="Recompute posts.votes from the votes table."
+    )
+    recount.add_argument("--chunk-size", type=int, default=10000)
+
+    rescore = commands.add_parser(
+        "rescore-posts", help="Repair the hot scores of the feed after writes that bypassed votes."
+    )
+    rescore.add_argument("--chunk-size", type=int, default=10000)
+
+    commands.add_parser(
+        "rebuild-stats", help="Recompute the profile stats of every user from posts and votes."
+    )
+
+    importer = commands.add_parser(
+        "import", help="Bulk load users, posts or votes from an NDJSON or CSV file with COPY."
+    )
+    importer.add_argument("kind", choices=[kind.value for kind in ImportKind])
+    importer.add_argument("path")
+    importer.add_argument(
+        "--format", choices=[format.value for format in ImportFormat],
+        help="ndjson, or csv for .csv files, by default"
+    )
+    importer.add_argument("--batch-size", type=int, help="rows validated and hashed at once")
+
+    server = commands.add_parser(
+        "serve", help="Serve the application from several worker processes."
+    )
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=8000)
+    server.add_argument(
+        "--workers", type=int, help="worker processes, WEB_CONCURRENCY or the CPU count by default"
+    )
+    server.add_argument(
+        "--preload", action=BooleanOptionalAction, default=True,
+        help="build the application once before forking the workers"
+    )
+    server.add_argument(
+        "--max-requests", type=int, help="restart a worker after this many requests, 0 never"
+    )
+    server.add_argument(
+        "--max-requests-jitter", type=int, help="add up to this many requests to each limit"
+    )
+    server.add_argument("--log-level", default="info")
+    server.add_argument(
+        "--proxy-headers", action=BooleanOptionalAction,
+        help="take the client address from X-Forwarded-For, PROXY_HEADERS by default"
+    )
+    server.add_argument(
+        "--forwarded-allow-ips",
+        help="comma separated proxy addresses to trust, or *, FORWARDED_ALLOW_IPS by default"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "recount-votes":
+        with SessionLocal() as db:
+            fixed = reconcile_vote_counts(db, chunk_size=args.chunk_size)
+
+        print(f"Fixed vote counts of {fixed} posts.")
+
+    elif args.command == "rescore-posts":
+        with SessionLocal() as db:
+            fixed = rescore_posts(db, chunk_size=args.chunk_size)
+
+        print(f"Fixed hot scores of {fixed} posts.")
+
+    elif args.command == "rebuild-stats":
+        with SessionLocal() as db:
+            fixed = rebuild_stats(db)
+
+        print(f"Fixed stats of {fixed} users.")
+
+    elif args.command == "import":
+        format = ImportFormat(args.format or ("csv" if args.path.endswith(".csv") else "ndjson"))
+
+        with open(args.path, "rb") as stream, SessionLocal() as db:
+            report = import_rows(
+                db, ImportKind(args.kind), stream, format, batch_size=args.batch_size
+            )
+
+        print(report.json(indent=2))
+
+    elif args.command == "serve":
+        sys.exit(serve(
+            args.host,
+            args.port,
+            args.workers or settings.web_concurrency or os.cpu_count() or 1,
+            preload=args.preload,
+            max_requests=(
+                settings.max_requests if args.max_requests is None else args.max_requests
+            ),
+            max_requests_jitter=(
+                settings.max_requests_jitter if args.max_requests_jitter is None
+                else args.max_requests_jitter
+            ),
+            log_level=args.log_level,
+            proxy_headers=(
+                settings.proxy_headers if args.proxy_headers is None else args.proxy_headers
+            ),
+            forwarded_allow_ips=args.forwarded_allow_ips or settings.forwarded_allow_ips
+        ))
+
+
+if __name__ == "__main__":
+    main()
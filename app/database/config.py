@@ -1,4 +1,6 @@
+from functools import lru_cache
 from pydantic import BaseSettings
+from typing import Any, List
 
 
 class Settings(BaseSettings):
@@ -10,9 +12,81 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    database_async: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 0
+    threadpool_size: int = 0
+    database_replica_urls: List[str] = []
+    replica_pin_seconds: float = 5
+    replica_cooldown_seconds: float = 30
+    token_cache_size: int = 10000
+    token_cache_ttl: float = 300
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 30
+    bcrypt_rounds: int = 12
+    hash_workers: int = 0
+    hash_max_pending: int = 64
+    vote_write_behind: bool = False
+    vote_flush_interval: float = 1.0
+    vote_flush_threshold: int = 1000
+    batch_max_items: int = 100
+    cache_control: str = "no-cache"
+    fast_serialization: bool = False
+    metrics_enabled: bool = True
+    sql_profiler: bool = False
+    slow_query_ms: float = 100
+    n_plus_one_threshold: int = 10
+    check_migrations: bool = False
+    web_concurrency: int = 0
+    max_requests: int = 0
+    max_requests_jitter: int = 0
+    proxy_headers: bool = True
+    forwarded_allow_ips: str = "127.0.0.1"
+    export_batch_size: int = 1000
+    import_batch_size: int = 10000
+    admin_user_ids: List[int] = []
+    rate_limit_enabled: bool = True
+    rate_limit_stripes: int = 64
+    rate_limit_max_keys: int = 100000
+    rate_limit_sweep_interval: float = 60
+    login_ip_rate: float = 1
+    login_ip_burst: int = 30
+    login_username_rate: float = 0.1
+    login_username_burst: int = 10
+    signup_ip_rate: float = 0.2
+    signup_ip_burst: int = 10
+    write_rate: float = 20
+    write_burst: int = 100
+    compression_enabled: bool = True
+    compression_min_size: int = 500
+    compression_gzip_level: int = 6
+    compression_brotli_level: int = 4
+    compression_zstd_level: int = 3
 
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """ Returns the settings, read from the environment and .env on first use. """
+
+    return Settings()
+
+
+class LazySettings:
+    """ Stand-in for the settings that only reads them when an attribute is first used. """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(get_settings(), name, value)
+
+
+# Importing a module never reads the environment, so the app can be imported unconfigured.
+settings = LazySettings()
@@ -1,18 +1,136 @@
 from .config import settings
+from app.libs.lifecycle import after_fork
+from app.libs.metrics import track_pool, TimedPool
 
+from functools import lru_cache
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncEngine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import List
 
 
-SQLALCHEMY_DATABASE_URL = (
-    f"postgresql://{settings.database_username}:"
-    f"{settings.database_password}@{settings.database_hostname}/{settings.database_name}"
-)
+# Every engine made so far, primary and replicas, sync and async.
+_engines: List[Engine] = []
+
+
+def database_url() -> str:
+    """ Returns the URL of the primary database, from the settings. """
+
+    return (
+        f"postgresql://{settings.database_username}:"
+        f"{settings.database_password}@{settings.database_hostname}/{settings.database_name}"
+    )
+
+
+def async_url(url: str) -> str:
+    """ Returns a database URL for the asyncpg driver. """
+
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+class TimedQueuePool(TimedPool, QueuePool):
+    metrics_label = "sync"
+
+
+class TimedAsyncQueuePool(TimedPool, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def pool_options() -> dict:
+    """ Returns the pool settings shared by the primary and the replica engines. """
+
+    # Pre-ping tests each connection on checkout, recycle replaces connections older than it.
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def make_engine(url: str, poolclass: type) -> Engine:
+    """ Returns an engine on a database, with the configured pool and statement timeout. """
+
+    # Every session gets the server-side statement timeout, 0 leaves it to the server.
+    engine = create_engine(
+        url,
+        poolclass=poolclass,
+        connect_args={"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"},
+        **pool_options()
+    )
+    _engines.append(engine)
+
+    return engine
+
+
+def make_async_engine(url: str, poolclass: type) -> AsyncEngine:
+    """ Returns an asyncpg engine on a database, with the configured pool and statement timeout. """
+
+    async_engine = create_async_engine(
+        async_url(url),
+        poolclass=poolclass,
+        connect_args={
+            "server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}
+        },
+        **pool_options()
+    )
+    _engines.append(async_engine.sync_engine)
+
+    return async_engine
 
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@after_fork
+def dispose_inherited_pools() -> None:
+    """ Gives a forked worker fresh pools, leaving the parent's connections open for it. """
+
+    # Sharing a connection between processes interleaves their protocol on one socket.
+    for engine in _engines:
+        engine.dispose(close=False)
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    """ Returns the engine on the primary database, created on first use. """
+
+    engine = make_engine(database_url(), TimedQueuePool)
+    track_pool(engine, "sync")
+
+    return engine
+
+
+@lru_cache(maxsize=None)
+def get_async_engine() -> AsyncEngine:
+    """ Returns the asyncpg engine on the primary database, created on first use. """
+
+    async_engine = make_async_engine(database_url(), TimedAsyncQueuePool)
+    track_pool(async_engine.sync_engine, "async")
+
+    return async_engine
+
+
+class PrimarySession(Session):
+    """ Session on the primary engine, unless it was given another bind. """
+
+    def get_bind(self, mapper=None, **kw):
+        return self.bind if self.bind is not None else get_engine()
+
+
+class AsyncPrimarySession(Session):
+    """ Session behind an AsyncSession on the async primary engine, unless given another bind. """
+
+    def get_bind(self, mapper=None, **kw):
+        return self.bind if self.bind is not None else get_async_engine().sync_engine
+
+
+# Sessions resolve their engine when they first connect, so importing this module is free.
+SessionLocal = sessionmaker(class_=PrimarySession, autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=AsyncPrimarySession, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
 
@@ -21,6 +139,11 @@ def get_db():
 
     try:
         yield db
-        
+
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,54 @@
+from .config import settings
+from .database import get_async_engine, get_engine
+
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from anyio import to_thread
+from pathlib import Path
+from sqlalchemy.engine import Connection
+from typing import Set
+
+
+# The Alembic scripts live next to the app package, wherever the server is started from.
+SCRIPT_LOCATION = Path(__file__).resolve().parents[2] / "alembic"
+
+
+def head_revisions() -> Set[str]:
+    """ Returns the head revisions of the migration scripts. """
+
+    config = Config()
+    config.set_main_option("script_location", str(SCRIPT_LOCATION))
+
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def check_revision(connection: Connection) -> None:
+    """ Raises RuntimeError unless the database is migrated to the head revision. """
+
+    current = set(MigrationContext.configure(connection).get_current_heads())
+    heads = head_revisions()
+
+    if current != heads:
+        raise RuntimeError(
+            f"Database is at revision {', '.join(sorted(current)) or 'none'}, expected "
+            f"{', '.join(sorted(heads))}. Run `alembic upgrade head` first."
+        )
+
+
+def check_primary_revision() -> None:
+    """ Checks the revision of the primary database on a sync connection. """
+
+    with get_engine().connect() as connection:
+        check_revision(connection)
+
+
+async def check_migrations() -> None:
+    """ Checks the revision of the primary database with the engine of the current mode. """
+
+    if settings.database_async:
+        async with get_async_engine().connect() as connection:
+            await connection.run_sync(check_revision)
+
+    else:
+        await to_thread.run_sync(check_primary_revision)
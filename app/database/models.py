@@ -1,7 +1,8 @@
 from .database import Base
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, Computed, FetchedValue, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 
@@ -13,6 +14,19 @@ class User(Base):
     email = Column(String, nullable=False, unique=True)
     password = Column(String, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    xmin = deferred(Column(String, FetchedValue(), server_onupdate=FetchedValue(), system=True))
+    # Only loaded by the queries that join it, a user read elsewhere has no stats.
+    stats = relationship("UserStats", uselist=False, lazy="noload")
+
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    posts = Column(Integer, server_default='0', nullable=False)
+    votes_received = Column(Integer, server_default='0', nullable=False)
+    votes_cast = Column(Integer, server_default='0', nullable=False)
+    xmin = deferred(Column(String, FetchedValue(), server_onupdate=FetchedValue(), system=True))
     
 
 class Post(Base):
@@ -25,11 +39,35 @@ class Post(Base):
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
     owner_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'), nullable=False)
     votes = Column(Integer, server_default='0', nullable=False)
+    # Hot score of a new post without votes, see app.libs.ranking.
+    hot = Column(
+        DOUBLE_PRECISION,
+        server_default=text("(extract(epoch from now()) - 1134028003) / 45000"),
+        nullable=False
+    )
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed("to_tsvector('english', title || ' ' || content)", persisted=True)
+    ))
+    xmin = deferred(Column(String, FetchedValue(), server_onupdate=FetchedValue(), system=True))
     owner = relationship("User")
 
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_posts_hot_id", "hot", "id"),
+        Index("ix_posts_votes_id", "votes", "id"),
+        Index("ix_posts_owner_id_id", "owner_id", "id"),
+    )
+
 
 class Vote(Base):
     __tablename__ = "votes"
 
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
-    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
\ No newline at end of file
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+
+    # The primary key leads with the voter, votes of a post need their own index.
+    __table_args__ = (
+        Index("ix_votes_post_id_user_id", "post_id", "user_id"),
+    )
\ No newline at end of file
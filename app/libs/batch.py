@@ -0,0 +1,35 @@
+from app.database.config import settings
+from app.routers.schemas.schemas import BatchItemResult
+
+from fastapi import status, HTTPException
+from pydantic import BaseModel, ValidationError
+from typing import Any, List, Tuple, Type
+
+
+def validate_batch(
+    items: List[Any],
+    schema: Type[BaseModel]
+) -> Tuple[List[Tuple[int, BaseModel]], List[BatchItemResult]]:
+    """ Validates every item of a batch, returns the valid items and the rejected ones. """
+
+    # Check if the batch is within the configured size.
+    if len(items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batches are limited to {settings.batch_max_items} items."
+        )
+
+    valid, rejected = [], []
+
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.parse_obj(item)))
+
+        except ValidationError as exc:
+            rejected.append(BatchItemResult(
+                index=index,
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=exc.errors()
+            ))
+
+    return valid, rejected
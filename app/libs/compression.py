@@ -0,0 +1,218 @@
+from functools import lru_cache
+from starlette.datastructures import Headers, MutableHeaders
+from typing import Callable, Dict, Optional
+
+import zlib
+
+try:
+    import brotli
+
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+
+except ImportError:
+    zstandard = None
+
+
+# Media types worth compressing, already compressed ones such as images are left alone.
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript",
+    "application/xml", "image/svg+xml"
+)
+
+# Responses without a body, or one the client already holds.
+UNCOMPRESSED_STATUSES = {204, 304}
+
+
+class GzipEncoder:
+    """ Incremental gzip encoder, from the standard library. """
+
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    """ Incremental brotli encoder, available when the brotli package is installed. """
+
+    def __init__(self, level: int) -> None:
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    """ Incremental zstd encoder, available when the zstandard package is installed. """
+
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Encoders by content coding, in the order preferred when the client weighs them equally: zstd
+# and brotli both beat gzip on size, zstd at a lower CPU cost.
+ENCODERS: Dict[str, Callable] = {
+    **({"zstd": ZstdEncoder} if zstandard else {}),
+    **({"br": BrotliEncoder} if brotli else {}),
+    "gzip": GzipEncoder,
+}
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """ Returns the preferred available coding of an Accept-Encoding header, None for identity. """
+
+    weights = {}
+
+    for item in accept_encoding.lower().split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        weight = 1.0
+
+        for param in params:
+            name, _, value = param.partition("=")
+
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+
+                except ValueError:
+                    weight = 0.0
+
+        weights[coding] = weight
+
+    best, best_weight = None, 0.0
+
+    for coding in ENCODERS:
+        weight = weights.get(coding, weights.get("*", 0.0))
+
+        if weight > best_weight:
+            best, best_weight = coding, weight
+
+    return best
+
+
+def is_compressible(status_code: int, headers: Headers) -> bool:
+    """ Checks if a response may be compressed, given its status and headers. """
+
+    if status_code < 200 or status_code in UNCOMPRESSED_STATUSES:
+        return False
+
+    if "content-encoding" in headers:
+        return False
+
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ ASGI middleware compressing responses with the best coding the client accepts.
+
+    Complete bodies below minimum_size are sent as they are. Streamed bodies are compressed
+    chunk by chunk, each chunk flushed so the client receives it without waiting for the rest.
+    """
+
+    def __init__(self, app, minimum_size: int, levels: Dict[str, int]) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = levels
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        coding = None
+
+        # HEAD responses carry the length of the uncompressed body, leave them as they are.
+        if scope["method"] != "HEAD":
+            coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+
+        start: Optional[dict] = None
+        encoder = None
+
+        async def send_compressed(message: dict) -> None:
+            nonlocal start, encoder
+
+            # Hold the headers back until the first chunk tells how large the body is.
+            if message["type"] == "http.response.start":
+                start = message
+                return
+
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is not None:
+                headers = MutableHeaders(scope=start)
+                headers.add_vary_header("Accept-Encoding")
+
+                if coding and is_compressible(start["status"], headers):
+                    length = int(headers.get("content-length", -1)) if more_body else len(body)
+
+                    if length < 0 or length >= self.minimum_size:
+                        encoder = ENCODERS[coding](self.levels[coding])
+                        headers["Content-Encoding"] = coding
+
+                        # The compressed bytes are only a weak match of the tagged ones,
+                        # revalidation ignores the W/ prefix.
+                        etag = headers.get("etag")
+
+                        if etag and not etag.startswith("W/"):
+                            headers["ETag"] = f"W/{etag}"
+
+                        if more_body:
+                            del headers["Content-Length"]
+
+                if encoder is not None and not more_body:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                    message = {"type": "http.response.body", "body": body}
+
+                    # A complete body is compressed in one go, no encoder is needed any longer.
+                    encoder = None
+
+                elif encoder is not None:
+                    message = {
+                        "type": "http.response.body",
+                        "body": encoder.compress(body) + encoder.flush(),
+                        "more_body": True
+                    }
+
+                await send(start)
+                start = None
+
+                return await send(message)
+
+            if encoder is not None:
+                body = encoder.compress(body) + (encoder.flush() if more_body else encoder.finish())
+                message = {"type": "http.response.body", "body": body, "more_body": more_body}
+
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,174 @@
+from app.database.config import settings
+from app.database.database import SessionLocal
+from app.database.models import Post, Vote
+from app.libs.lifecycle import after_fork
+from app.libs.ranking import hot_score
+from app.libs.stats import add_stats
+
+from collections import defaultdict
+from sqlalchemy import column, func, select, update, values, Integer
+from sqlalchemy.orm import Session
+from threading import Event, Lock, Thread
+from typing import Optional
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class VoteCounterBuffer:
+    """ Collects posts.votes deltas in memory and writes them in batched UPDATEs. """
+
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[int] = None) -> None:
+        self._interval = interval
+        self._threshold = threshold
+        self.reset()
+
+    @property
+    def interval(self) -> float:
+        """ Seconds between flushes, the configured interval unless one was given. """
+
+        return settings.vote_flush_interval if self._interval is None else self._interval
+
+    @property
+    def threshold(self) -> int:
+        """ Pending deltas that trigger an early flush, the configured one unless given. """
+
+        return settings.vote_flush_threshold if self._threshold is None else self._threshold
+
+    def add(self, post_id: int, delta: int) -> None:
+        """ Records a counter delta, waking the flusher once the threshold is reached. """
+
+        with self._lock:
+            self._deltas[post_id] += delta
+            self._pending += 1
+            full = self._pending >= self.threshold
+
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """ Writes every pending delta in one UPDATE along with the stats of the posts' owners,
+        returns the number of posts updated.
+        """
+
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+            self._pending = 0
+
+        # Votes that cancel each other out do not need a write.
+        rows = sorted((post_id, delta) for post_id, delta in deltas.items() if delta)
+
+        if not rows:
+            return 0
+
+        pending = values(
+            column("id", Integer), column("delta", Integer), name="pending"
+        ).data(rows)
+
+        try:
+            # A Core update, since ORM-enabled updates cannot return the pending deltas.
+            posts = Post.__table__
+
+            with SessionLocal() as db:
+                counted = db.execute(
+                    update(posts)
+                    .where(posts.c.id == pending.c.id)
+                    .values(
+                        votes=posts.c.votes + pending.c.delta,
+                        hot=hot_score(posts.c.votes + pending.c.delta, posts.c.created_at)
+                    )
+                    .returning(posts.c.owner_id, pending.c.delta)
+                ).all()
+
+                # Deltas of deleted posts are dropped, their votes left the stats with them.
+                if counted:
+                    db.execute(add_stats(
+                        (owner_id, "votes_received", delta) for owner_id, delta in counted
+                    ))
+
+                db.commit()
+
+        # Keep the deltas for the next flush rather than losing them.
+        except Exception:
+            with self._lock:
+                for post_id, delta in rows:
+                    self._deltas[post_id] += delta
+                    self._pending += 1
+
+            raise
+
+        return len(rows)
+
+    def start(self) -> None:
+        """ Starts flushing in a background thread. """
+
+        if self._thread is not None:
+            return
+
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="vote-counter-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Stops the background thread and writes whatever is still pending. """
+
+        if self._thread is not None:
+            self._stopped.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+        self.flush()
+
+    def reset(self) -> None:
+        """ Drops the pending deltas and the flusher thread, without writing anything. """
+
+        self._deltas: defaultdict[int, int] = defaultdict(int)
+        self._pending = 0
+        self._lock = Lock()
+        self._wake = Event()
+        self._stopped = Event()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+            try:
+                self.flush()
+
+            except Exception:
+                logger.exception("Could not flush vote counters.")
+
+
+# Follows the settings, read once the buffer is used.
+vote_counters = VoteCounterBuffer()
+
+# The parent flushes its own deltas, a forked worker must not write them a second time.
+after_fork(vote_counters.reset)
+
+
+def reconcile_vote_counts(db: Session, chunk_size: int = 10000) -> int:
+    """ Recomputes posts.votes and hot scores from the votes in chunks, returns the posts fixed.
+
+    Deltas still buffered by a running write-behind worker are applied on top of the
+    recomputed counts, so run it while the application is drained or stopped.
+    """
+
+    max_id = db.scalar(select(func.max(Post.id))) or 0
+    vote_count = select(func.count()).where(Vote.post_id == Post.id).scalar_subquery()
+    fixed = 0
+
+    for start in range(0, max_id, chunk_size):
+        fixed += db.execute(
+            update(Post)
+            .where(Post.id > start, Post.id <= start + chunk_size)
+            .where(Post.votes != vote_count)
+            .values(votes=vote_count, hot=hot_score(vote_count, Post.created_at))
+        ).rowcount
+        db.commit()
+
+    return fixed
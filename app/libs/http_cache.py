@@ -0,0 +1,43 @@
+from app.database.config import settings
+
+from fastapi import status, Request, Response
+from hashlib import blake2b
+from typing import Any, Dict
+
+
+def make_etag(*versions: Any) -> str:
+    """ Returns a strong entity tag, given the row versions a representation is built from. """
+
+    # Drivers disagree on the type of xmin, psycopg2 returns a string and asyncpg an int.
+    digest = blake2b(",".join(map(str, versions)).encode(), digest_size=16).hexdigest()
+
+    return f'"{digest}"'
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    """ Checks if the client already holds the representation tagged etag. """
+
+    header = request.headers.get("if-none-match")
+
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    tags = (tag.strip() for tag in header.split(","))
+
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """ Returns the validator and caching headers of a representation. """
+
+    return {"ETag": etag, "Cache-Control": settings.cache_control}
+
+
+def not_modified(etag: str) -> Response:
+    """ Returns an empty 304 response for a representation the client already holds. """
+
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
@@ -0,0 +1,306 @@
+from app.database.config import settings
+from app.database.models import Post, User, Vote
+from app.libs.ranking import hot_score
+from app.libs.stats import recount_stats
+from app.libs.utils import hash_many
+from app.routers.schemas.schemas import (
+    ImportFormat, ImportKind, ImportRejection, ImportReport, PostImport, UserImport, VoteImport
+)
+
+from datetime import datetime, timezone
+from itertools import islice
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import (
+    cast, func, select, union, update, Boolean, Column, Insert, Integer, MetaData, Select,
+    String, Table, TIMESTAMP, Update
+)
+from sqlalchemy.dialects.postgresql import insert, REGCLASS
+from sqlalchemy.orm import Session
+from time import perf_counter
+from typing import (
+    Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type
+)
+
+import csv
+import io
+import orjson
+
+
+# Rejections listed in a report, the rest are only counted.
+MAX_REJECTIONS = 100
+
+# Schema and staging columns of each kind, rows are copied in this column order.
+IMPORTS: Dict[ImportKind, Tuple[Type[BaseModel], Tuple[Tuple[str, Any], ...]]] = {
+    ImportKind.users: (UserImport, (
+        ("id", Integer),
+        ("email", String),
+        ("password", String),
+        ("created_at", TIMESTAMP(timezone=True)),
+    )),
+    ImportKind.posts: (PostImport, (
+        ("id", Integer),
+        ("title", String),
+        ("content", String),
+        ("published", Boolean),
+        ("created_at", TIMESTAMP(timezone=True)),
+        ("owner_id", Integer),
+    )),
+    ImportKind.votes: (VoteImport, (
+        ("user_id", Integer),
+        ("post_id", Integer),
+    )),
+}
+
+
+class CsvStream:
+    """ File-like view over rows encoded as CSV, read by COPY without holding them in memory. """
+
+    def __init__(self, rows: Iterable[Sequence[object]]) -> None:
+        self._rows = iter(rows)
+        self._chunk = io.StringIO()
+        self._writer = csv.writer(self._chunk, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            self._writer.writerows(islice(self._rows, 1000))
+            chunk = self._chunk.getvalue()
+
+            if not chunk:
+                break
+
+            self._chunk.seek(0)
+            self._chunk.truncate()
+            self._buffer += chunk
+
+        if size < 0:
+            size = len(self._buffer)
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+
+        return data
+
+
+def read_records(stream: BinaryIO, format: ImportFormat) -> Iterator[Tuple[int, Any]]:
+    """ Yields the line number and the raw record of every row of an NDJSON or CSV stream. """
+
+    if format == ImportFormat.csv:
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+
+        # Empty cells stand for missing values, so the schema defaults apply to them.
+        for record in reader:
+            yield reader.line_num, {name: value for name, value in record.items() if value != ""}
+
+        return
+
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            yield number, line
+
+
+def parse_record(schema: Type[BaseModel], record: Any) -> BaseModel:
+    """ Returns a record validated by schema, raising ValueError when it cannot be stored. """
+
+    if isinstance(record, bytes):
+        try:
+            record = orjson.loads(record)
+
+        except orjson.JSONDecodeError as exc:
+            raise ValueError(f"Invalid JSON: {exc}")
+
+    item = schema.parse_obj(record)
+
+    # Postgres text cannot hold NUL characters, COPY would fail on the whole import.
+    if any(isinstance(value, str) and "\x00" in value for value in item.__dict__.values()):
+        raise ValueError("Text must not contain NUL characters.")
+
+    return item
+
+
+def staging_table(kind: ImportKind) -> Table:
+    """ Returns the temporary table rows of a kind are copied into, dropped on commit. """
+
+    _, columns = IMPORTS[kind]
+
+    return Table(
+        f"import_{kind.value}",
+        MetaData(),
+        *(Column(name, type_) for name, type_ in columns),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP"
+    )
+
+
+def insert_staged(kind: ImportKind, staging: Table) -> Insert:
+    """ Returns an insert of the staged rows that reference existing rows and are not taken. """
+
+    rows = select(staging)
+
+    if kind == ImportKind.users:
+        target = User
+
+    elif kind == ImportKind.posts:
+        target = Post
+        rows = rows.where(staging.c.owner_id.in_(select(User.id)))
+
+    else:
+        target = Vote
+        rows = rows.where(
+            staging.c.user_id.in_(select(User.id)),
+            staging.c.post_id.in_(select(Post.id))
+        )
+
+    # Rows whose id or email is taken, or votes that already exist, are skipped.
+    return insert(target).from_select(list(staging.c.keys()), rows).on_conflict_do_nothing()
+
+
+def recount_posts(post_ids: Select) -> Update:
+    """ Returns an update recomputing the counters and hot scores of the selected posts. """
+
+    # One grouped pass over the votes, instead of a count per post.
+    counted = (
+        select(Vote.post_id, func.count().label("votes"))
+        .where(Vote.post_id.in_(post_ids))
+        .group_by(Vote.post_id)
+        .subquery()
+    )
+
+    return update(Post).where(Post.id == counted.c.post_id).values(
+        votes=counted.c.votes, hot=hot_score(counted.c.votes, Post.created_at)
+    ).execution_options(synchronize_session=False)
+
+
+def affected_users(kind: ImportKind, staging: Table) -> Select:
+    """ Returns a select of the users whose stats the staged rows change. """
+
+    if kind == ImportKind.users:
+        return select(staging.c.id)
+
+    if kind == ImportKind.posts:
+        return select(staging.c.owner_id)
+
+    return union(
+        select(staging.c.user_id),
+        select(Post.owner_id).where(Post.id.in_(select(staging.c.post_id)))
+    )
+
+
+def sync_sequence(db: Session, model: type) -> None:
+    """ Moves a table's id sequence past the imported ids, never backwards. """
+
+    sequence = func.pg_get_serial_sequence(model.__tablename__, "id")
+    last_value = func.coalesce(func.pg_sequence_last_value(cast(sequence, REGCLASS)), 1)
+
+    db.execute(select(func.setval(
+        sequence, func.greatest(select(func.max(model.id)).scalar_subquery(), last_value)
+    )))
+
+
+def import_rows(
+    db: Session,
+    kind: ImportKind,
+    stream: BinaryIO,
+    format: ImportFormat = ImportFormat.ndjson,
+    batch_size: Optional[int] = None
+) -> ImportReport:
+    """ Bulk loads NDJSON or CSV rows of a kind with COPY in one transaction, returns a report.
+
+    Rows are validated by the import schemas and copied into a staging table, then inserted
+    where they reference existing rows and take no used id, email or vote. Vote counters, hot
+    scores and the stats of the users concerned are recomputed before the commit.
+    """
+
+    schema, columns = IMPORTS[kind]
+    names = [name for name, _ in columns]
+    batch_size = batch_size or settings.import_batch_size
+    rejections: List[ImportRejection] = []
+    counts = {"read": 0, "rejected": 0}
+    start = perf_counter()
+
+    def valid_rows() -> Iterator[tuple]:
+        records = read_records(stream, format)
+        now = datetime.now(timezone.utc)
+
+        while batch := list(islice(records, batch_size)):
+            items = []
+
+            for line, record in batch:
+                counts["read"] += 1
+
+                try:
+                    items.append(parse_record(schema, record))
+
+                except (ValidationError, ValueError) as exc:
+                    counts["rejected"] += 1
+
+                    if len(rejections) < MAX_REJECTIONS:
+                        detail = exc.errors() if isinstance(exc, ValidationError) else str(exc)
+                        rejections.append(ImportRejection(line=line, detail=detail))
+
+            # Hash the passwords of a batch at once, in parallel across the hashing processes.
+            if kind == ImportKind.users:
+                for item, password in zip(items, hash_many([item.password for item in items])):
+                    item.password = password
+
+            for item in items:
+                values = item.__dict__
+
+                # COPY gets no NULLs, missing creation times are filled in here.
+                if values.get("created_at", now) is None:
+                    values["created_at"] = now
+
+                yield tuple(values[name] for name in names)
+
+    staging = staging_table(kind)
+    connection = db.connection()
+
+    # Imports run far longer than requests, lift the statement timeout for this transaction.
+    db.execute(select(func.set_config("statement_timeout", "0", True)))
+    staging.create(connection)
+
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {staging.name} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)",
+            CsvStream(valid_rows())
+        )
+
+    # The planner knows nothing of a fresh temporary table until it is analyzed.
+    connection.exec_driver_sql(f"ANALYZE {staging.name}")
+
+    staged = counts["read"] - counts["rejected"]
+    imported = db.execute(insert_staged(kind, staging)).rowcount
+
+    # New posts have no votes yet, only their hot scores depend on their creation time.
+    if kind == ImportKind.posts:
+        db.execute(
+            update(Post)
+            .where(Post.id.in_(select(staging.c.id)))
+            .values(hot=hot_score(Post.votes, Post.created_at))
+            .execution_options(synchronize_session=False)
+        )
+
+    elif kind == ImportKind.votes:
+        db.execute(recount_posts(select(staging.c.post_id)))
+
+    db.execute(recount_stats(affected_users(kind, staging)))
+    db.commit()
+
+    if kind == ImportKind.users:
+        sync_sequence(db, User)
+
+    elif kind == ImportKind.posts:
+        sync_sequence(db, Post)
+
+    db.commit()
+    seconds = perf_counter() - start
+
+    return ImportReport(
+        kind=kind,
+        read=counts["read"],
+        imported=imported,
+        rejected=counts["rejected"],
+        skipped=staged - imported,
+        seconds=round(seconds, 3),
+        rows_per_second=round(counts["read"] / seconds, 1) if seconds else 0.0,
+        rejections=rejections
+    )
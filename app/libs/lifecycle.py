@@ -0,0 +1,17 @@
+from typing import Callable
+
+import os
+
+
+def after_fork(hook: Callable[[], None]) -> Callable[[], None]:
+    """ Runs a hook in every forked worker, to reset the state it inherited from the parent.
+
+    Hooks run in the child right after fork, before any request is served, so they must not
+    do IO or release resources that still belong to the parent.
+    """
+
+    # There is no fork on Windows, so there is nothing to reset either.
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=hook)
+
+    return hook
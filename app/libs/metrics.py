@@ -0,0 +1,273 @@
+from bisect import bisect_left
+from sqlalchemy import exc
+from starlette.routing import Match
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+
+# Every metric registers itself here when it is created, /metrics renders them in order.
+REGISTRY: List["Metric"] = []
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        pairs = ",".join(f'{key}="{escape(str(label))}"' for key, label in labels.items())
+        name = f"{name}{{{pairs}}}"
+
+    return f"{name} {value!r}"
+
+
+class Metric:
+    """ Named family of samples, one per combination of label values. """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        """ Returns the metric in the Prometheus text exposition format. """
+
+        lines = [
+            f"# HELP {self.name} {escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines += [format_sample(name, labels, value) for name, labels, value in self.samples()]
+
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """ Monotonic total, such as a count of errors. """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = list(self._values.items())
+
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in values]
+
+
+class Gauge(Metric):
+    """ Value that goes up and down, either set directly or read from a callback on scrape. """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[tuple, float] = {}
+        self._functions: Dict[tuple, Callable[[], float]] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set_function(self, function: Callable[[], float], *labels: str) -> None:
+        """ Reads the value from function at scrape time, so it costs nothing in between. """
+
+        with self._lock:
+            self._functions[labels] = function
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+
+        values.update((key, float(function())) for key, function in functions)
+
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in values.items()]
+
+
+class Histogram(Metric):
+    """ Distribution of observed values, such as latencies, over fixed buckets. """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Buckets are stored apart and only made cumulative when rendered.
+        index = bisect_left(self.buckets, value)
+
+        with self._lock:
+            series = self._series.get(labels)
+
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+
+        samples = []
+
+        for key, counts, total in series:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", {**labels, "le": le}, cumulative))
+
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+
+        return samples
+
+
+def render() -> str:
+    """ Returns every registered metric in the Prometheus text exposition format. """
+
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "Time to serve a request.", ("method", "route")
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests being served.", ("method", "route")
+)
+http_errors = Counter(
+    "http_errors_total", "Responses with a 4xx or 5xx status.", ("method", "route", "status")
+)
+pool_checkout_seconds = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection.", ("pool",)
+)
+pool_timeouts = Counter(
+    "db_pool_timeouts_total", "Checkouts that gave up waiting for a connection.", ("pool",)
+)
+pool_size = Gauge("db_pool_size", "Configured number of pooled connections.", ("pool",))
+pool_checked_out = Gauge("db_pool_checked_out", "Connections in use.", ("pool",))
+pool_overflow = Gauge("db_pool_overflow", "Connections open beyond the pool size.", ("pool",))
+password_hash_seconds = Histogram(
+    "password_hash_seconds", "Time bcrypt spends hashing or verifying a password.", ("operation",)
+)
+jwt_decode_seconds = Histogram("jwt_decode_seconds", "Time to decode and verify an access token.")
+rate_limited = Counter("rate_limited_total", "Requests refused by a rate limit.", ("limit",))
+cache_hits = Gauge("cache_hits", "Lookups answered from an in-process cache.", ("cache",))
+cache_misses = Gauge("cache_misses", "Lookups an in-process cache could not answer.", ("cache",))
+cache_entries = Gauge("cache_entries", "Entries held by an in-process cache.", ("cache",))
+
+
+class TimedPool:
+    """ Pool mixin that records how long each checkout waits for a connection, and timeouts. """
+
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = perf_counter()
+
+        try:
+            return super()._do_get()
+
+        except exc.TimeoutError:
+            pool_timeouts.inc(self.metrics_label)
+            raise
+
+        finally:
+            pool_checkout_seconds.observe(perf_counter() - start, self.metrics_label)
+
+
+def track_pool(engine, label: str) -> None:
+    """ Exposes the size, checked out and overflow gauges of an engine's queue pool. """
+
+    # Read the pool through the engine, since dispose() replaces it.
+    pool_size.set_function(lambda: engine.pool.size(), label)
+    pool_checked_out.set_function(lambda: engine.pool.checkedout(), label)
+    pool_overflow.set_function(lambda: max(engine.pool.overflow(), 0), label)
+
+
+def track_cache(get_cache: Callable, label: str) -> None:
+    """ Exposes the hit, miss and size gauges of the cache returned by get_cache. """
+
+    # Read the cache through its accessor, since workers replace it after forking.
+    cache_hits.set_function(lambda: get_cache().stats()["hits"], label)
+    cache_misses.set_function(lambda: get_cache().stats()["misses"], label)
+    cache_entries.set_function(lambda: get_cache().stats()["size"], label)
+
+
+class MetricsMiddleware:
+    """ ASGI middleware recording latency, in-flight requests and errors per route template. """
+
+    def __init__(self, app, routes: Sequence) -> None:
+        self.app = app
+        self.routes = routes
+
+    def route_of(self, scope: dict) -> str:
+        # Label by route template, so ids in paths do not create new series.
+        for route in self.routes:
+            match, _ = route.matches(scope)
+
+            if match == Match.FULL:
+                return route.path
+
+        return "unmatched"
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method, route = scope["method"], self.route_of(scope)
+        status_code = 500
+
+        async def send_status(message: dict) -> None:
+            nonlocal status_code
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+            await send(message)
+
+        http_requests_in_flight.inc(method, route)
+        start = perf_counter()
+
+        try:
+            await self.app(scope, receive, send_status)
+
+        finally:
+            http_requests_in_flight.dec(method, route)
+            http_request_seconds.observe(perf_counter() - start, method, route)
+
+            if status_code >= 400:
+                http_errors.inc(method, route, str(status_code))
\ No newline at end of file
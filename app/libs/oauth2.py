@@ -1,30 +1,69 @@
 from app.database.config import settings
-from app.database.database import get_db
+from app.database.database import get_async_db, get_db
 from app.database.models import User
+from app.libs.cache import TTLCache
+from app.libs.lifecycle import after_fork
+from app.libs.metrics import jwt_decode_seconds, track_cache
 from app.routers.schemas.schemas import TokenData
 
 from datetime import datetime, timedelta
 from fastapi import status, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
+from functools import lru_cache
+from hashlib import sha256
 from jose import jwt, JWTError
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from typing import Optional
+
+import time
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
 
+# Reads and rate limits accept a token when there is one, without requiring it.
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login', auto_error=False)
+
+
+@lru_cache(maxsize=None)
+def get_token_cache() -> TTLCache:
+    """ Returns the verified token claims, keyed by token digest. """
+
+    return TTLCache(settings.token_cache_size, settings.token_cache_ttl)
+
+
+@lru_cache(maxsize=None)
+def get_user_cache() -> TTLCache:
+    """ Returns the cached users, keyed by id.
+
+    Only ORM updates and deletes made by this process drop a user from the cache. Changes made
+    by other workers or by Core statements show once the entry expires, so the time to live is
+    the bound on how stale a cached user can be.
+    """
+
+    return TTLCache(settings.user_cache_size, settings.user_cache_ttl)
+
+
+track_cache(get_token_cache, "token")
+track_cache(get_user_cache, "user")
+
+
+@after_fork
+def reset_caches() -> None:
+    """ Starts every worker with empty caches, instead of copies of the parent's. """
 
-SECRET_KEY = settings.secret_key
-ALGORITHM = settings.algorithm
-ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+    get_token_cache.cache_clear()
+    get_user_cache.cache_clear()
 
 
 def create_access_token(data: dict) -> str:
     """ Creates access token, given a piece of data. """
 
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
     return encoded_jwt
 
@@ -32,8 +71,16 @@ def create_access_token(data: dict) -> str:
 def verify_access_token(token: str, credentials_exception) -> TokenData:
     """ Decodes and verifies a given token, returns token data. """
 
+    key = sha256(token.encode()).digest()
+    token_data = get_token_cache().get(key)
+
+    if token_data is not None:
+        return token_data
+
+    start = time.perf_counter()
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         id: str = payload.get("user_id")
 
         if id is None:
@@ -43,23 +90,84 @@ def verify_access_token(token: str, credentials_exception) -> TokenData:
     
     except JWTError:
         raise credentials_exception
+
+    finally:
+        jwt_decode_seconds.observe(time.perf_counter() - start)
+
+    # Never keep a token cached past its expiry.
+    if "exp" in payload:
+        get_token_cache().set(key, token_data, ttl=payload["exp"] - time.time())
+
+    else:
+        get_token_cache().set(key, token_data)
     
     return token_data
 
 
-def get_current_user(
-    token: TokenData = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
-) -> User:
-    """ Returns current user, given a token. """
-    
-    credentials_exception = HTTPException(
+def cache_user(user: Optional[User]) -> Optional[User]:
+    """ Caches the columns of a user, except its password and row version, returns the user. """
+
+    if user is not None:
+        get_user_cache().set(str(user.id), {
+            column.key: getattr(user, column.key)
+            for column in User.__table__.columns
+            if column.key != "password" and not column.system
+        })
+
+    return user
+
+
+def cached_user(id: str) -> Optional[User]:
+    """ Returns a detached copy of a cached user, or None if it is not cached. """
+
+    values = get_user_cache().get(str(id))
+
+    return User(**values) if values is not None else None
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_user(mapper, connection, target: User) -> None:
+    """ Drops a user from the cache when it changes through the ORM in this process. """
+
+    get_user_cache().pop(str(target.id))
+
+
+def credentials_exception() -> HTTPException:
+    """ Returns the exception raised when a token cannot be validated. """
+
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials.",
         headers={"WWW-Authenticate": "Bearer"}
     )
+
+
+def get_current_user(
+    token: TokenData = Depends(oauth2_scheme), 
+    db: Session = Depends(get_db)
+) -> User:
+    """ Returns current user, given a token, from the cache when possible. """
     
-    token = verify_access_token(token, credentials_exception)
-    user = db.query(User).filter(User.id == token.id).first()
+    token = verify_access_token(token, credentials_exception())
+    user = cached_user(token.id)
+
+    if user is None:
+        user = cache_user(db.scalar(select(User).where(User.id == int(token.id))))
+
+    return user
+
+
+async def get_current_user_async(
+    token: TokenData = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """ Returns current user, given a token, using an async session. """
+
+    token = verify_access_token(token, credentials_exception())
+    user = cached_user(token.id)
+
+    if user is None:
+        user = cache_user(await db.scalar(select(User).where(User.id == int(token.id))))
 
-    return user
\ No newline at end of file
+    return user
@@ -0,0 +1,39 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from fastapi import status, HTTPException
+from typing import Any, List
+
+import json
+
+
+def encode_cursor(*values: Any) -> str:
+    """ Encodes the sort key of the last row of a page into an opaque cursor. """
+
+    keys = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(keys, separators=(",", ":")).encode()
+
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> List[Any]:
+    """ Decodes an opaque cursor into its sort key, given the type of every key. """
+
+    invalid_cursor = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor."
+    )
+
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        keys = json.loads(raw)
+
+        if not isinstance(keys, list) or len(keys) != len(types):
+            raise invalid_cursor
+
+        return [
+            datetime.fromisoformat(key) if type_ is datetime else type_(key)
+            for key, type_ in zip(keys, types)
+        ]
+
+    except (ValueError, TypeError):
+        raise invalid_cursor
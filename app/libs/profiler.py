@@ -0,0 +1,161 @@
+from app.database.config import settings
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from time import perf_counter
+from typing import Callable, Iterator, List, Optional
+
+import logging
+import re
+
+
+logger = logging.getLogger(__name__)
+
+# Literals and bound parameters, so statements differing only in values compare equal.
+PARAMETERS = re.compile(r"%\(\w+\)s|\$\d+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PARAMETER_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    """ Returns a statement with its parameters and literals replaced by placeholders. """
+
+    statement = PARAMETERS.sub("?", statement)
+    statement = PARAMETER_LISTS.sub("?", statement)
+
+    return WHITESPACE.sub(" ", statement).strip()
+
+
+class QueryProfile:
+    """ Statements run while a request or a query budget is active, with their total time. """
+
+    def __init__(self, route: str = "-") -> None:
+        self.route = route
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[normalize(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[tuple]:
+        """ Returns the statements run at least threshold times, the likely N+1 patterns. """
+
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+# The profile of the current request, and the query budgets of the running tests.
+_profile: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+_budgets: List[QueryProfile] = []
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    seconds = perf_counter() - conn.info["query_start"].pop()
+    profile = _profile.get()
+
+    if profile is not None:
+        profile.record(statement, seconds)
+
+    for budget in _budgets:
+        budget.record(statement, seconds)
+
+    if seconds * 1000 >= settings.slow_query_ms:
+        # Keep password hashes out of the logs.
+        if "password" in statement:
+            parameters = "<redacted>"
+
+        logger.warning(
+            "Slow query on %s took %.1f ms: %s; parameters: %r",
+            profile.route if profile else "-", seconds * 1000, statement, parameters
+        )
+
+
+def handle_error(exception_context) -> None:
+    # A failed statement never reaches after_cursor_execute, drop its start time.
+    connection = exception_context.connection
+
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+def install(engine: Engine) -> None:
+    """ Hooks the profiler into an engine's statement events, once. """
+
+    if not event.contains(engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(engine, "handle_error", handle_error)
+
+
+@contextmanager
+def query_budget(max_queries: int, *engines: Engine) -> Iterator[QueryProfile]:
+    """ Fails with AssertionError if the block runs more than max_queries statements.
+
+    Statements are counted on every hooked engine while the block runs, including the
+    ones issued by a test client serving requests from another thread.
+    """
+
+    for engine in engines:
+        install(engine)
+
+    budget = QueryProfile("budget")
+    _budgets.append(budget)
+
+    try:
+        yield budget
+
+    finally:
+        _budgets.remove(budget)
+
+    if budget.count > max_queries:
+        statements = "\n".join(f"{count} x {sql}" for sql, count in budget.statements.items())
+
+        raise AssertionError(
+            f"Ran {budget.count} queries, over the budget of {max_queries}:\n{statements}"
+        )
+
+
+class ProfilerMiddleware:
+    """ ASGI middleware counting the statements and database time of each request. """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = QueryProfile(f"{scope['method']} {scope['path']}")
+        token = _profile.set(profile)
+
+        async def send_headers(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                # The route is known once the router has matched the request.
+                if "route" in scope:
+                    profile.route = f"{scope['method']} {scope['route'].path}"
+
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-db-queries", str(profile.count).encode()),
+                    (b"x-db-time", f"{profile.seconds * 1000:.2f}".encode()),
+                ]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_headers)
+
+        finally:
+            _profile.reset(token)
+
+        for sql, count in profile.repeated(settings.n_plus_one_threshold):
+            logger.warning("Possible N+1 on %s, %d x %s", profile.route, count, sql)
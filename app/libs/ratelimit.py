@@ -0,0 +1,189 @@
+from app.database.config import settings
+from app.libs.lifecycle import after_fork
+from app.libs.metrics import rate_limited
+from app.libs.oauth2 import credentials_exception, optional_oauth2_scheme, verify_access_token
+
+from fastapi import status, HTTPException, Request, Depends
+from fastapi.security.oauth2 import OAuth2PasswordRequestForm
+from functools import lru_cache
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, Optional, Protocol, Tuple
+
+import math
+
+
+class RateLimitBackend(Protocol):
+    """ Store of token buckets, shared by every worker when it lives outside the process. """
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        """ Takes a token from the bucket of a key, returns 0 if one was taken, or else the
+        seconds until the next one is available.
+        """
+
+
+class MemoryBackend:
+    """ Token buckets of one process, spread over stripes that each have their own lock.
+
+    A bucket is stored as a single float, the time at which it will be full again, which is
+    the generic cell rate algorithm form of a token bucket. Buckets that are full again hold no
+    state and are swept out periodically, the least recently used ones go past max_keys.
+    """
+
+    def __init__(self, stripes: int, max_keys: int, sweep_interval: float) -> None:
+        self.sweep_interval = sweep_interval
+        self._stripes: List[Tuple[Dict[str, float], Lock]] = [
+            ({}, Lock()) for _ in range(max(1, stripes))
+        ]
+        self._max_keys = max(1, max_keys // len(self._stripes))
+        self._next_sweeps = [monotonic() + sweep_interval] * len(self._stripes)
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """ Takes a token from the bucket of a key, returns the seconds to wait if it is empty. """
+
+        index = hash(key) % len(self._stripes)
+        buckets, lock = self._stripes[index]
+        interval = 1 / rate
+        now = monotonic()
+
+        with lock:
+            full_at = max(buckets.pop(key, now), now)
+            wait = full_at - now - (burst - 1) * interval
+
+            # A refused request takes no token, so retrying clients are not locked out longer.
+            if wait <= 0:
+                full_at += interval
+
+            # Reinserting keeps each stripe in least recently used order.
+            buckets[key] = full_at
+
+            if len(buckets) > self._max_keys:
+                del buckets[next(iter(buckets))]
+
+            if now >= self._next_sweeps[index]:
+                self._next_sweeps[index] = now + self.sweep_interval
+
+                for stale in [stale for stale, until in buckets.items() if until <= now]:
+                    del buckets[stale]
+
+        return max(wait, 0.0)
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        return self.take(key, rate, burst)
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets, _ in self._stripes)
+
+
+@lru_cache(maxsize=None)
+def get_memory_backend() -> MemoryBackend:
+    """ Returns the buckets of this process, created on first use. """
+
+    return MemoryBackend(
+        settings.rate_limit_stripes, settings.rate_limit_max_keys,
+        settings.rate_limit_sweep_interval
+    )
+
+
+@after_fork
+def reset_memory_backend() -> None:
+    """ Starts every worker with its own buckets, and locks no other thread may be holding. """
+
+    get_memory_backend.cache_clear()
+
+
+async def rate_limit_backend() -> RateLimitBackend:
+    """ Returns the bucket store, override this dependency to share buckets across workers. """
+
+    return get_memory_backend()
+
+
+def too_many_requests(wait: float) -> HTTPException:
+    """ Returns the exception raised when a request exceeds a rate limit. """
+
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, try again later.",
+        headers={"Retry-After": str(math.ceil(wait))}
+    )
+
+
+async def check_limits(backend: RateLimitBackend, *limits: Tuple[str, str, float, int]) -> None:
+    """ Takes a token from the (name, key, rate, burst) bucket of every limit in turn, raises
+    429 at the first empty one.
+    """
+
+    if not settings.rate_limit_enabled:
+        return
+
+    for name, key, rate, burst in limits:
+        wait = await backend.acquire(f"{name}:{key}", rate, burst)
+
+        if wait > 0:
+            rate_limited.inc(name)
+
+            raise too_many_requests(wait)
+
+
+def client_ip(request: Request) -> str:
+    """ Returns the address of the client, as forwarded by trusted proxies. """
+
+    return request.client.host if request.client else "unknown"
+
+
+async def limit_login(
+    request: Request,
+    user_credentials: OAuth2PasswordRequestForm = Depends(),
+    backend: RateLimitBackend = Depends(rate_limit_backend)
+) -> None:
+    """ Throttles login attempts by client address, and by username from that address, before
+    bcrypt runs.
+    """
+
+    ip = client_ip(request)
+
+    # Guessing one account's password from one address is slowed down, while attempts from
+    # elsewhere cannot lock its owner out.
+    await check_limits(
+        backend,
+        ("login-ip", ip, settings.login_ip_rate, settings.login_ip_burst),
+        (
+            "login-username", f"{ip}:{user_credentials.username.lower()}",
+            settings.login_username_rate, settings.login_username_burst
+        )
+    )
+
+
+async def limit_signup(
+    request: Request,
+    backend: RateLimitBackend = Depends(rate_limit_backend)
+) -> None:
+    """ Throttles account creation, which hashes a password, by client address. """
+
+    await check_limits(
+        backend,
+        ("signup-ip", client_ip(request), settings.signup_ip_rate, settings.signup_ip_burst)
+    )
+
+
+async def limit_writes(
+    request: Request,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    backend: RateLimitBackend = Depends(rate_limit_backend)
+) -> None:
+    """ Throttles writes by the user id of the access token, without loading the user. """
+
+    key = None
+
+    if token:
+        try:
+            key = f"user:{verify_access_token(token, credentials_exception()).id}"
+
+        # The write will be refused anyway, count it against the address meanwhile.
+        except HTTPException:
+            pass
+
+    await check_limits(
+        backend,
+        ("write", key or f"ip:{client_ip(request)}", settings.write_rate, settings.write_burst)
+    )
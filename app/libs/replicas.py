@@ -0,0 +1,217 @@
+from app.database.config import settings
+from app.database.database import (
+    make_async_engine, make_engine, AsyncSessionLocal, SessionLocal, TimedAsyncQueuePool,
+    TimedQueuePool
+)
+from app.libs.metrics import track_pool
+
+from contextvars import ContextVar
+from fastapi import Cookie
+from functools import lru_cache
+from http.cookies import SimpleCookie
+from itertools import count
+from math import ceil
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from threading import Lock
+from time import monotonic, time
+from typing import Callable, Dict, List, Optional
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# The commit times of the current request, a list so that handlers in the threadpool add to it.
+_writes: ContextVar[Optional[List[float]]] = ContextVar("writes", default=None)
+
+
+class ReplicaSet:
+    """ Round-robin over replica engines, skipping the ones that recently failed to connect. """
+
+    def __init__(self, engines: list, cooldown: float) -> None:
+        self.engines = engines
+        self.cooldown = cooldown
+        self._turn = count()
+        self._down_until: Dict[int, float] = {}
+        self._lock = Lock()
+
+    def candidates(self) -> list:
+        """ Returns the healthy replicas, starting with the one whose turn it is. """
+
+        if not self.engines:
+            return []
+
+        with self._lock:
+            start = next(self._turn) % len(self.engines)
+
+        now = monotonic()
+        rotated = self.engines[start:] + self.engines[:start]
+
+        return [engine for engine in rotated if self._down_until.get(id(engine), 0) <= now]
+
+    def mark_down(self, engine) -> None:
+        """ Takes a replica out of rotation for the cooldown period. """
+
+        logger.warning("Replica %s is unreachable, skipping it for %ss", engine.url, self.cooldown)
+        self._down_until[id(engine)] = monotonic() + self.cooldown
+
+
+def replica_pool(base: type, index: int, label: str) -> type:
+    # A pool class per replica, so each one has its own checkout metrics.
+    return type(f"Replica{index}{base.__name__}", (base,), {"metrics_label": label})
+
+
+@lru_cache(maxsize=None)
+def get_replicas() -> ReplicaSet:
+    """ Returns the replica engines, created on first use. """
+
+    engines = [
+        make_engine(url, replica_pool(TimedQueuePool, index, f"replica-{index}"))
+        for index, url in enumerate(settings.database_replica_urls)
+    ]
+
+    for index, engine in enumerate(engines):
+        track_pool(engine, f"replica-{index}")
+
+    return ReplicaSet(engines, settings.replica_cooldown_seconds)
+
+
+@lru_cache(maxsize=None)
+def get_async_replicas() -> ReplicaSet:
+    """ Returns the asyncpg replica engines, created on first use. """
+
+    engines = [
+        make_async_engine(url, replica_pool(TimedAsyncQueuePool, index, f"async-replica-{index}"))
+        for index, url in enumerate(settings.database_replica_urls)
+    ]
+
+    for index, engine in enumerate(engines):
+        track_pool(engine.sync_engine, f"async-replica-{index}")
+
+    return ReplicaSet(engines, settings.replica_cooldown_seconds)
+
+
+@event.listens_for(Session, "after_commit")
+def record_write(session: Session) -> None:
+    """ Notes that the current request committed a write, see LastWriteMiddleware. """
+
+    writes = _writes.get()
+
+    if writes is not None:
+        writes.append(time())
+
+
+class LastWriteMiddleware:
+    """ ASGI middleware handing a client the time of its last write, in the last_write cookie.
+
+    The client sends the cookie back, and get_read_db reads from the primary while the write
+    is recent, so any worker or instance serving the client sees it.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        writes: List[float] = []
+        token = _writes.set(writes)
+
+        async def send_cookie(message: dict) -> None:
+            if message["type"] == "http.response.start" and writes:
+                cookie = SimpleCookie()
+                cookie["last_write"] = f"{writes[-1]:.3f}"
+                cookie["last_write"].update({
+                    "max-age": ceil(settings.replica_pin_seconds), "path": "/",
+                    "httponly": True, "samesite": "lax"
+                })
+
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"set-cookie", cookie.output(header="").strip().encode()),
+                ]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_cookie)
+
+        finally:
+            _writes.reset(token)
+
+
+def reads_pinned(last_write: Optional[str]) -> bool:
+    """ Checks if a client wrote recently, so its reads must see the primary. """
+
+    try:
+        written_at = float(last_write)
+
+    # Reads are public, a missing or mangled cookie simply reads from a replica.
+    except (TypeError, ValueError):
+        return False
+
+    # Either side of now, the clocks of the instances may be slightly apart.
+    return abs(time() - written_at) < settings.replica_pin_seconds
+
+
+def get_read_db(last_write: Optional[str] = Cookie(None)):
+    """ Yields a session on a healthy replica, or on the primary if none is usable. """
+
+    db = None
+    replicas = get_replicas()
+
+    if replicas.engines and not reads_pinned(last_write):
+        for replica_engine in replicas.candidates():
+            db = SessionLocal(bind=replica_engine)
+
+            # Connect up front, so an unreachable replica falls back to the next one.
+            try:
+                db.connection()
+                break
+
+            except DBAPIError:
+                db.close()
+                db = None
+                replicas.mark_down(replica_engine)
+
+    if db is None:
+        db = SessionLocal()
+
+    try:
+        yield db
+
+    finally:
+        db.close()
+
+
+async def get_async_read_db(last_write: Optional[str] = Cookie(None)):
+    """ Yields an async session on a healthy replica, or on the primary if none is usable. """
+
+    db = None
+    async_replicas = get_async_replicas()
+
+    if async_replicas.engines and not reads_pinned(last_write):
+        for replica_engine in async_replicas.candidates():
+            db = AsyncSessionLocal(bind=replica_engine)
+
+            # asyncpg raises connection failures as plain OSErrors.
+            try:
+                await db.connection()
+                break
+
+            except (DBAPIError, OSError):
+                await db.close()
+                db = None
+                async_replicas.mark_down(replica_engine)
+
+    if db is None:
+        db = AsyncSessionLocal()
+
+    try:
+        yield db
+
+    finally:
+        await db.close()
@@ -0,0 +1,115 @@
+from app import main
+
+from typing import Set, Union
+
+import logging
+import os
+import random
+import signal
+import socket
+import uvicorn
+
+
+# Worker lifecycle messages go to the uvicorn log, next to the ones of the workers themselves.
+logger = logging.getLogger("uvicorn.error")
+
+# Exit status of a worker whose application failed to start, which stops the whole server.
+BOOT_FAILURE = 3
+
+
+def run_worker(app: Union[str, object], sock: socket.socket, max_requests: int, **options) -> int:
+    """ Serves on the inherited socket until stopped or recycled, returns the exit status. """
+
+    config = uvicorn.Config(
+        app,
+        limit_max_requests=max_requests or None,
+        **options
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+    return 0 if server.started else BOOT_FAILURE
+
+
+def serve(
+    host: str,
+    port: int,
+    workers: int,
+    preload: bool = True,
+    max_requests: int = 0,
+    max_requests_jitter: int = 0,
+    **options
+) -> int:
+    """ Serves the application from forked workers sharing one socket, returns the exit status.
+
+    A worker that exits, for instance after serving max_requests requests, is replaced by a new
+    one. Preloading builds the application once in the parent, so configuration errors stop the
+    server before any worker starts and the workers share the imported code.
+    """
+
+    app = main.app if preload else "app.main:app"
+    sock = uvicorn.Config(app, host=host, port=port, **options).bind_socket()
+    children: Set[int] = set()
+    stopping = False
+
+    def spawn() -> None:
+        # Spread the recycling of the workers, so they do not all restart at once.
+        limit = max_requests + random.randint(0, max_requests_jitter) if max_requests else 0
+        pid = os.fork()
+
+        if pid == 0:
+            status = 1
+
+            try:
+                # The worker installs its own handlers, until then the defaults apply.
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                status = run_worker(app, sock, limit, **options)
+
+            finally:
+                os._exit(status)
+
+        children.add(pid)
+
+    def stop(signum: int, frame) -> None:
+        nonlocal stopping
+
+        stopping = True
+
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    status = 0
+
+    while children:
+        pid, wait_status = os.wait()
+
+        if pid not in children:
+            continue
+
+        children.remove(pid)
+        code = os.waitstatus_to_exitcode(wait_status)
+
+        # Restarting a worker that cannot start would only loop, stop the server instead.
+        if code == BOOT_FAILURE and not stopping:
+            logger.error("Worker %d failed to start, stopping the server", pid)
+            status = BOOT_FAILURE
+            stop(signal.SIGTERM, None)
+
+        elif not stopping:
+            logger.info("Worker %d exited with status %d, starting a new one", pid, code)
+            spawn()
+
+    sock.close()
+
+    return status
@@ -0,0 +1,91 @@
+from app.database.models import Post, User, UserStats, Vote
+
+from collections import defaultdict
+from sqlalchemy import func, select, tuple_, Insert, Select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Optional, Tuple
+
+
+STAT_COLUMNS = ("posts", "votes_received", "votes_cast")
+
+
+def add_stats(changes: Iterable[Tuple[int, str, int]]) -> Insert:
+    """ Returns an upsert adding (user id, column, amount) changes to the users' statistics.
+
+    The changes are merged into one row per user, in user id order, so that concurrent writers
+    lock the rows of user_stats in the same order and never deadlock on them.
+    """
+
+    totals: Dict[int, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(STAT_COLUMNS, 0))
+
+    for user_id, name, amount in changes:
+        totals[user_id][name] += amount
+
+    statement = insert(UserStats).values(
+        [{"user_id": user_id, **amounts} for user_id, amounts in sorted(totals.items())]
+    )
+
+    return statement.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            name: getattr(UserStats, name) + getattr(statement.excluded, name)
+            for name in STAT_COLUMNS
+        }
+    )
+
+
+def recount_stats(user_ids: Optional[Select] = None) -> Insert:
+    """ Returns an upsert recomputing from posts and votes the stats of the selected users, or
+    of every user, counting each table in one pass.
+    """
+
+    posts = select(Post.owner_id.label("user_id"), func.count().label("posts"))
+    received = select(Post.owner_id.label("user_id"), func.count().label("votes_received")).join(
+        Vote, Vote.post_id == Post.id
+    )
+    cast = select(Vote.user_id, func.count().label("votes_cast"))
+    users = select(User.id)
+
+    if user_ids is not None:
+        posts = posts.where(Post.owner_id.in_(user_ids))
+        received = received.where(Post.owner_id.in_(user_ids))
+        cast = cast.where(Vote.user_id.in_(user_ids))
+        users = users.where(User.id.in_(user_ids))
+
+    posts = posts.group_by(Post.owner_id).subquery()
+    received = received.group_by(Post.owner_id).subquery()
+    cast = cast.group_by(Vote.user_id).subquery()
+
+    statement = insert(UserStats).from_select(
+        ["user_id", *STAT_COLUMNS],
+        users.add_columns(
+            func.coalesce(posts.c.posts, 0),
+            func.coalesce(received.c.votes_received, 0),
+            func.coalesce(cast.c.votes_cast, 0)
+        )
+        .outerjoin(posts, posts.c.user_id == User.id)
+        .outerjoin(received, received.c.user_id == User.id)
+        .outerjoin(cast, cast.c.user_id == User.id)
+    )
+    current = tuple_(*(getattr(UserStats, name) for name in STAT_COLUMNS))
+    rebuilt = tuple_(*(getattr(statement.excluded, name) for name in STAT_COLUMNS))
+
+    return statement.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={name: getattr(statement.excluded, name) for name in STAT_COLUMNS},
+        where=current.is_distinct_from(rebuilt)
+    )
+
+
+def rebuild_stats(db: Session) -> int:
+    """ Recomputes the statistics of every user from posts and votes, returns the users fixed.
+
+    Run it while writes are drained, the changes made meanwhile would be overwritten by the
+    recomputed values.
+    """
+
+    fixed = db.execute(recount_stats()).rowcount
+    db.commit()
+
+    return fixed
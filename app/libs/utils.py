@@ -1,16 +1,200 @@
+from app.database.config import settings
+from app.libs.lifecycle import after_fork
+from app.libs.metrics import password_hash_seconds
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from fastapi import status, HTTPException
+from functools import lru_cache
 from passlib.context import CryptContext
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from typing import Any, Callable, Deque, List, Optional, Sequence, Tuple
+
+import asyncio
+import multiprocessing
+import os
+
+
+# Hashing runs in worker processes, so it neither holds the GIL nor a request thread.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = Lock()
+
+
+@lru_cache(maxsize=None)
+def hash_slots() -> BoundedSemaphore:
+    """ Returns the semaphore bounding the hashing calls queued or running at once. """
+
+    return BoundedSemaphore(settings.hash_max_pending)
+
+
+@lru_cache(maxsize=None)
+def crypt_context(rounds: int) -> CryptContext:
+    """ Returns a bcrypt context that flags hashes of any other cost as needing an update. """
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds
+    )
+
+
+def _hash(password: str, rounds: int) -> str:
+    return crypt_context(rounds).hash(password)
+
+
+def _verify_and_update(
+    plain_password: str, hashed_password: str, rounds: int
+) -> Tuple[bool, Optional[str]]:
+    return crypt_context(rounds).verify_and_update(plain_password, hashed_password)
+
+
+def _timed(fn: Callable, *args) -> Tuple[Any, float]:
+    # Time the call in the worker, so queueing in the pool is not counted as bcrypt time.
+    start = perf_counter()
+    result = fn(*args)
+
+    return result, perf_counter() - start
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """ Returns the process pool used for hashing, starting it on first use. """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.hash_workers or None,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """ Stops the hashing processes. """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+@after_fork
+def forget_pool() -> None:
+    """ Lets a forked worker start its own hashing pool, the inherited one is the parent's. """
+
+    global _pool, _pool_lock
+
+    _pool = None
+    _pool_lock = Lock()
+    hash_slots.cache_clear()
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def submit(fn: Callable, *args) -> Future:
+    """ Queues a hashing call on the pool, failing fast with 503 when the queue is full. """
+
+    if not hash_slots().acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations in progress.",
+            headers={"Retry-After": "1"}
+        )
+
+    return submit_held(fn, *args)
+
+
+def submit_held(fn: Callable, *args) -> Future:
+    """ Queues a hashing call on the pool for a caller holding one of the hash slots, which
+    is released once the call is done.
+    """
+
+    slots = hash_slots()
+
+    try:
+        timed_future = get_pool().submit(_timed, fn, *args)
+
+    except Exception:
+        slots.release()
+        raise
+
+    future = Future()
+    operation = fn.__name__.lstrip("_")
+
+    def done(timed_future: Future) -> None:
+        slots.release()
+
+        try:
+            result, seconds = timed_future.result()
+
+        except BaseException as exc:
+            future.set_exception(exc)
+
+        else:
+            password_hash_seconds.observe(seconds, operation)
+            future.set_result(result)
+
+    timed_future.add_done_callback(done)
+
+    return future
 
 
 def hash(password: str) -> str:
     """ Returns hashed password, given a plain password. """
 
-    return pwd_context.hash(password)
+    return submit(_hash, password, settings.bcrypt_rounds).result()
+
+
+def hash_many(passwords: Sequence[str]) -> List[str]:
+    """ Returns the hashes of many passwords, spread over every hashing process, for imports. """
+
+    # Keep one password per process in flight, each holding a hash slot, so a login queues
+    # behind one round of the import at most and the 503 back-pressure still applies.
+    in_flight = min(settings.hash_workers or os.cpu_count() or 1, settings.hash_max_pending)
+    futures: Deque[Future] = deque()
+    hashes = []
+
+    for password in passwords:
+        if len(futures) >= in_flight:
+            hashes.append(futures.popleft().result())
+
+        # Imports wait for a slot rather than fail, they are not answering a client.
+        hash_slots().acquire()
+        futures.append(submit_held(_hash, password, settings.bcrypt_rounds))
+
+    return hashes + [future.result() for future in futures]
 
 
 def verify(plain_password: str, hashed_password: str) -> bool:
     """ Compares a plain password to hashed password. """
-    
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+
+    return verify_and_update(plain_password, hashed_password)[0]
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """ Compares a plain password to hashed password, returns a new hash if the cost changed. """
+
+    return submit(
+        _verify_and_update, plain_password, hashed_password, settings.bcrypt_rounds
+    ).result()
+
+
+async def hash_async(password: str) -> str:
+    """ Returns hashed password, given a plain password, without blocking the event loop. """
+
+    return await asyncio.wrap_future(submit(_hash, password, settings.bcrypt_rounds))
+
+
+async def verify_and_update_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """ Compares a plain password to hashed password without blocking the event loop. """
+
+    return await asyncio.wrap_future(
+        submit(_verify_and_update, plain_password, hashed_password, settings.bcrypt_rounds)
+    )
@@ -1,33 +1,152 @@
-from .database.database import engine
-from .database.models import Base
-from .routers import auth, post, user, vote
+from .database.config import settings
+from .database.database import get_async_engine, get_engine
+from .libs.compression import CompressionMiddleware
+from .libs.counters import vote_counters
+from .libs.metrics import MetricsMiddleware
+from .libs.profiler import install, ProfilerMiddleware
+from .libs.replicas import get_async_replicas, get_replicas, LastWriteMiddleware
+from .libs.utils import shutdown_pool
+from .routers import admin, auth, metrics, post, user, vote
+from .routers.aio import (
+    admin as async_admin, auth as async_auth, post as async_post, user as async_user,
+    vote as async_vote
+)
 
-from fastapi import FastAPI
+from anyio import to_thread
+from contextlib import asynccontextmanager
+from fastapi import status, FastAPI, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import exc
+from typing import AsyncIterator
 
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """ Starts the background work on startup, releases the pools and engines on shutdown. """
 
-app = FastAPI()
+    # Alembic owns the schema, the app only checks it is up to date, and only imports it then.
+    if settings.check_migrations:
+        from .database.migrations import check_migrations
 
-origins = ["*"]
+        await check_migrations()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    # Run no more sync handlers at once than there are connections, so threads never queue on
+    # the pool while holding a worker.
+    limiter = to_thread.current_default_thread_limiter()
+    limiter.total_tokens = settings.threadpool_size or (
+        settings.db_pool_size + settings.db_max_overflow
+    )
+
+    if settings.vote_write_behind:
+        vote_counters.start()
+
+    try:
+        yield
+
+    finally:
+        vote_counters.stop()
+        shutdown_pool()
+
+        get_engine().dispose()
+
+        for replica_engine in get_replicas().engines:
+            replica_engine.dispose()
+
+        if settings.database_async:
+            await get_async_engine().dispose()
 
-app.include_router(post.router)
-app.include_router(user.router)
-app.include_router(auth.router)
-app.include_router(vote.router)
+            for replica_engine in get_async_replicas().engines:
+                await replica_engine.dispose()
+
+
+async def pool_exhausted(request: Request, error: exc.TimeoutError) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "No database connection available, try again later."},
+        headers={"Retry-After": "1"}
+    )
 
 
-@app.get("/")
 def root():
     return {
         "message": "Hello world."
-    }
\ No newline at end of file
+    }
+
+
+def create_app() -> FastAPI:
+    """ Builds the application from the settings, without touching the database. """
+
+    # Fast mode encodes every response with orjson, see app.libs.serializers.
+    app = FastAPI(
+        default_response_class=ORJSONResponse if settings.fast_serialization else JSONResponse,
+        lifespan=lifespan
+    )
+
+    origins = ["*"]
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "X-DB-Queries", "X-DB-Time", "X-Next-Cursor"],
+    )
+
+    # Compress responses with the coding the client prefers, inside the metrics so that the
+    # recorded latency includes the compression time.
+    if settings.compression_enabled:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.compression_min_size,
+            levels={
+                "gzip": settings.compression_gzip_level,
+                "br": settings.compression_brotli_level,
+                "zstd": settings.compression_zstd_level,
+            }
+        )
+
+    # Async mode serves the same routes from async def handlers on AsyncSession.
+    if settings.database_async:
+        routers = (async_post, async_user, async_auth, async_vote, async_admin)
+    else:
+        routers = (post, user, auth, vote, admin)
+
+    for router in routers:
+        app.include_router(router.router)
+
+    # Hand each client the time of its last write, so its next reads go to the primary.
+    if settings.database_replica_urls:
+        app.add_middleware(LastWriteMiddleware)
+
+    # Record latency, in-flight requests and errors per route, and expose them on /metrics.
+    if settings.metrics_enabled:
+        app.add_middleware(MetricsMiddleware, routes=app.routes)
+        app.include_router(metrics.router)
+
+    # Count the statements and database time of each request, log slow and repeated statements.
+    if settings.sql_profiler:
+        for profiled_engine in (get_engine(), *get_replicas().engines):
+            install(profiled_engine)
+
+        if settings.database_async:
+            for profiled_engine in (get_async_engine(), *get_async_replicas().engines):
+                install(profiled_engine.sync_engine)
+
+        app.add_middleware(ProfilerMiddleware)
+
+    app.add_exception_handler(exc.TimeoutError, pool_exhausted)
+    app.get("/")(root)
+
+    return app
+
+
+def __getattr__(name: str) -> FastAPI:
+    # Build app on first access, so `uvicorn app.main:app` serves it while imports read no settings.
+    if name == "app":
+        globals()["app"] = create_app()
+
+        return globals()["app"]
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,71 @@
+from app.database.config import settings
+from app.database.database import SessionLocal
+from app.database.models import User
+from app.libs.importer import import_rows
+from app.libs.oauth2 import get_current_user
+from .schemas.schemas import ImportFormat, ImportKind, ImportReport
+
+from fastapi import status, APIRouter, HTTPException, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from tempfile import TemporaryFile
+from typing import BinaryIO, Optional
+
+
+router = APIRouter(prefix="/admin", tags=['Admin'])
+
+
+def require_admin(current_user: User) -> None:
+    """ Checks that the current user is one of the configured administrators. """
+
+    if current_user.id not in settings.admin_user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to perform requested action."
+        )
+
+
+def request_format(request: Request, format: Optional[ImportFormat]) -> ImportFormat:
+    """ Returns the format of an import body, given explicitly or by its content type. """
+
+    if format is not None:
+        return format
+
+    content_type = request.headers.get("content-type", "")
+
+    return ImportFormat.csv if content_type.startswith("text/csv") else ImportFormat.ndjson
+
+
+async def spool_body(request: Request) -> BinaryIO:
+    """ Returns the request body written to a temporary file as it arrives. """
+
+    body = TemporaryFile()
+
+    async for chunk in request.stream():
+        body.write(chunk)
+
+    body.seek(0)
+
+    return body
+
+
+def import_body(kind: ImportKind, body: BinaryIO, format: ImportFormat) -> ImportReport:
+    """ Imports a spooled body on a session of its own, then removes the file. """
+
+    with body, SessionLocal() as db:
+        return import_rows(db, kind, body, format)
+
+
+@router.post("/import/{kind}", response_model=ImportReport)
+async def import_data(
+    kind: ImportKind,
+    request: Request,
+    format: Optional[ImportFormat] = None,
+    current_user: User = Depends(get_current_user)
+) -> ImportReport:
+    """ Bulk loads the NDJSON or CSV rows of the request body, given their kind. """
+
+    require_admin(current_user)
+    body = await spool_body(request)
+
+    # COPY runs on a sync connection, off the event loop.
+    return await run_in_threadpool(import_body, kind, body, request_format(request, format))
@@ -0,0 +1,27 @@
+from app.database.models import User
+from app.libs.oauth2 import get_current_user_async
+from app.routers.admin import import_body, request_format, require_admin, spool_body
+from app.routers.schemas.schemas import ImportFormat, ImportKind, ImportReport
+
+from fastapi import APIRouter, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+
+
+router = APIRouter(prefix="/admin", tags=['Admin'])
+
+
+@router.post("/import/{kind}", response_model=ImportReport)
+async def import_data(
+    kind: ImportKind,
+    request: Request,
+    format: Optional[ImportFormat] = None,
+    current_user: User = Depends(get_current_user_async)
+) -> ImportReport:
+    """ Bulk loads the NDJSON or CSV rows of the request body, given their kind. """
+
+    require_admin(current_user)
+    body = await spool_body(request)
+
+    # COPY streams from a file through psycopg2, on the sync engine even in async mode.
+    return await run_in_threadpool(import_body, kind, body, request_format(request, format))
@@ -0,0 +1,51 @@
+from app.database.database import get_async_db
+from app.database.models import User
+from app.libs.oauth2 import create_access_token
+from app.libs.ratelimit import limit_login
+from app.libs.utils import verify_and_update_async
+from app.routers.auth import invalid_credentials
+from app.routers.schemas.schemas import TokenResponse
+
+from fastapi import APIRouter, Depends
+from fastapi.security.oauth2 import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+router = APIRouter(prefix="/login", tags=['Authentication'])
+
+
+@router.post("/", response_model=TokenResponse, dependencies=[Depends(limit_login)])
+async def login(
+    user_credentials: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+) -> dict[str, str]:
+    """ Verifies user email and password during login, returns token. """
+
+    user = await db.scalar(select(User).where(User.email == user_credentials.username))
+
+    # Release the connection before bcrypt runs, the check takes far longer than the query.
+    await db.close()
+
+    # Check if email exists in database.
+    if not user:
+        raise invalid_credentials()
+
+    verified, new_hash = await verify_and_update_async(user_credentials.password, user.password)
+
+    # Check if given password matches hashed password.
+    if not verified:
+        raise invalid_credentials()
+
+    # Rehash the password when it was hashed with another cost factor.
+    if new_hash:
+        user.password = new_hash
+        db.add(user)
+        await db.commit()
+
+    access_token = create_access_token(data={"user_id": user.id})
+
+    return {
+        "access_token": access_token,
+        "token_type": "bearer"
+    }
@@ -0,0 +1,204 @@
+from app.database.database import get_async_db
+from app.database.models import Post, User
+from app.libs.batch import validate_batch
+from app.libs.http_cache import cache_headers, is_fresh, not_modified
+from app.libs.oauth2 import get_current_user_async
+from app.libs.ratelimit import limit_writes
+from app.libs.replicas import get_async_read_db
+from app.libs.serializers import dump_export, dump_post, respond
+from app.libs.stats import add_stats
+from app.routers.post import (
+    check_owner, delete_stats, insert_post, insert_posts, post_etag, post_not_found,
+    replace_post, reserve_post_ids, respond_page, select_deleted_post, select_export,
+    select_feed, select_page, select_post, select_post_owner, select_post_version, select_voters
+)
+from app.routers.schemas.schemas import BatchItemResult, FeedSort, PostCreate, PostResponse
+
+from datetime import datetime
+from fastapi import status, APIRouter, Body, Request, Response, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
+from typing import Any, AsyncIterator, List, Optional
+
+
+router = APIRouter(prefix="/posts", tags=['Posts'])
+
+
+async def stream_export(result: AsyncResult) -> AsyncIterator[bytes]:
+    """ Yields an export as NDJSON, one chunk per batch fetched from the cursor. """
+
+    async for rows in result.partitions():
+        yield dump_export(rows)
+
+
+@router.get("/", response_model=List[PostResponse])
+async def get_posts(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    limit: int = 10, skip: int = 0, search: Optional[str] = "",
+    cursor: Optional[str] = None
+) -> List[Post]:
+    """ Retrieves a page of posts from the database, newest first or by relevance. """
+
+    rows = (await db.execute(select_page(limit, skip, search, cursor))).all()
+
+    return respond_page(request, response, rows, limit)
+
+
+@router.get("/feed", response_model=List[PostResponse])
+async def get_feed(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    sort: FeedSort = FeedSort.hot,
+    limit: int = 10,
+    cursor: Optional[str] = None
+) -> List[Post]:
+    """ Retrieves a page of the feed, hottest, most voted or newest posts first. """
+
+    rows = (await db.execute(select_feed(sort, limit, cursor))).all()
+
+    return respond_page(request, response, rows, limit)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_posts(
+    db: AsyncSession = Depends(get_async_read_db),
+    owner_id: Optional[int] = None,
+    published: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    after_id: int = 0
+) -> StreamingResponse:
+    """ Streams the posts matching the filters as NDJSON, in id order from after_id.
+
+    A client that disconnects stops the stream after the current batch, the session and its
+    connection are released as the response ends.
+    """
+
+    result = await db.stream(
+        select_export(owner_id, published, created_after, created_before, after_id)
+    )
+
+    return StreamingResponse(stream_export(result), media_type="application/x-ndjson")
+
+
+@router.get("/{id}", response_model=PostResponse)
+async def get_one_post(
+    id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+) -> Post:
+    """ Retrieves a post from the database, given a post id. """
+
+    # Answer revalidations from the row versions alone, without loading the post.
+    if request.headers.get("if-none-match"):
+        versions = (await db.execute(select_post_version(id))).first()
+        etag = post_etag(id, *versions) if versions else None
+
+        if etag and is_fresh(request, etag):
+            return not_modified(etag)
+
+    row = (await db.execute(select_post(id))).first()
+
+    # Check if post exists in the database.
+    if not row:
+        raise post_not_found(id)
+
+    post, *versions = row
+    response.headers.update(cache_headers(post_etag(id, *versions)))
+
+    return respond(post, dump_post, response)
+
+
+@router.post(
+    "/", status_code=status.HTTP_201_CREATED, response_model=PostResponse,
+    dependencies=[Depends(limit_writes)]
+)
+async def create_post(
+    post: PostCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> Post:
+    """ Writes a new entry into the database, given a post. """
+
+    new_post_id = await db.scalar(insert_post(current_user.id, post))
+    await db.execute(add_stats([(current_user.id, "posts", 1)]))
+    await db.commit()
+
+    # Load the post together with its owner, lazy loads are not available here.
+    new_post = await db.scalar(select_post(new_post_id))
+
+    return respond(new_post, dump_post, status_code=status.HTTP_201_CREATED)
+
+
+@router.post("/batch", response_model=List[BatchItemResult], dependencies=[Depends(limit_writes)])
+async def create_posts(
+    items: List[Any] = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> List[BatchItemResult]:
+    """ Writes a batch of posts in one multi-row insert, returns a result per post. """
+
+    valid, results = validate_batch(items, PostCreate)
+
+    if valid:
+        # Reserve the ids up front so each result can be matched to its post.
+        ids = (await db.scalars(reserve_post_ids(len(valid)))).all()
+        statement, created = insert_posts(ids, valid, current_user.id)
+
+        await db.execute(statement)
+        await db.execute(add_stats([(current_user.id, "posts", len(ids))]))
+        await db.commit()
+        results += created
+
+    return sorted(results, key=lambda result: result.index)
+
+
+@router.delete(
+    "/{id}", status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(limit_writes)]
+)
+async def delete_post(
+    id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> Response:
+    """ Deletes a post from the database, given a post id. """
+
+    post = (await db.execute(select_deleted_post(id))).first()
+    check_owner(id, post.owner_id if post else None, current_user)
+
+    # Take the post and the votes deleted with it off the stats of their users.
+    voter_ids = (await db.scalars(select_voters(id))).all()
+    await db.execute(delete_stats(post.owner_id, post.votes, voter_ids))
+
+    # Delete post and save changes.
+    await db.execute(delete(Post).where(Post.id == id))
+    await db.commit()
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.put("/{id}", response_model=PostResponse, dependencies=[Depends(limit_writes)])
+async def update_post(
+    id: int,
+    updated_post: PostCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> Post:
+    """ Updates an entry from the database, given a post id and an updated post. """
+
+    owner_id = await db.scalar(select_post_owner(id))
+    check_owner(id, owner_id, current_user)
+
+    # Update post and save changes.
+    await db.execute(replace_post(id, updated_post))
+    await db.commit()
+
+    post = await db.scalar(select_post(id).execution_options(populate_existing=True))
+
+    return respond(post, dump_post)
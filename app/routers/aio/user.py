@@ -0,0 +1,81 @@
+from app.database.database import get_async_db
+from app.database.models import User, UserStats
+from app.libs.http_cache import cache_headers, is_fresh, not_modified
+from app.libs.ratelimit import limit_signup
+from app.libs.replicas import get_async_read_db
+from app.libs.serializers import dump_user, dump_user_detail, respond
+from app.libs.utils import hash_async
+from app.routers.schemas.schemas import UserCreate, UserDetailResponse, UserResponse
+from app.routers.user import (
+    email_in_use, select_user, select_user_version, user_etag, user_not_found, with_stats
+)
+
+from fastapi import status, APIRouter, Request, Response, Depends
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Union
+
+
+router = APIRouter(prefix="/users", tags=['Users'])
+
+
+@router.get("/{id}", response_model=Union[UserDetailResponse, UserResponse])
+async def get_one_user(
+    id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    include_stats: bool = False
+) -> User:
+    """ Retrieves a single user from the database, given a user id, with their stats if asked. """
+
+    # Answer revalidations from the row versions alone, without loading the user.
+    if request.headers.get("if-none-match"):
+        versions = (await db.execute(select_user_version(id, include_stats))).first()
+        etag = user_etag(id, *versions) if versions else None
+
+        if etag and is_fresh(request, etag):
+            return not_modified(etag)
+
+    row = (await db.execute(select_user(include_stats).where(User.id == id))).first()
+
+    # Check if user exists in database.
+    if not row:
+        raise user_not_found()
+
+    user, *versions = row
+    response.headers.update(cache_headers(user_etag(id, *versions)))
+
+    if include_stats:
+        return respond(with_stats(user), dump_user_detail, response)
+
+    return respond(user, dump_user, response)
+
+
+@router.post(
+    "/", status_code=status.HTTP_201_CREATED, response_model=UserResponse,
+    dependencies=[Depends(limit_signup)]
+)
+async def create_user(
+    user: UserCreate,
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """ Adds a new user into the database, given the email and password. """
+
+    # Hash password.
+    user.password = await hash_async(user.password)
+
+    # Start the user's stats along with the user, so profiles never lack them.
+    new_user = User(**user.dict(), stats=UserStats(posts=0, votes_received=0, votes_cast=0))
+    db.add(new_user)
+
+    # Write into database if email is available.
+    try:
+        await db.commit()
+
+    except IntegrityError:
+        raise email_in_use()
+
+    await db.refresh(new_user)
+
+    return respond(new_user, dump_user, status_code=status.HTTP_201_CREATED)
@@ -0,0 +1,120 @@
+from app.database.config import settings
+from app.database.database import get_async_db
+from app.database.models import User
+from app.libs.batch import validate_batch
+from app.libs.counters import vote_counters
+from app.libs.oauth2 import get_current_user_async
+from app.libs.ratelimit import limit_writes
+from app.libs.stats import add_stats
+from app.routers.schemas.schemas import BatchItemResult, VoteCreate
+from app.routers.vote import (
+    batch_results, count_votes, delete_votes, insert_votes, post_not_found, select_existing_posts,
+    vote_exists, vote_not_found, vote_stats
+)
+
+from fastapi import status, APIRouter, Body, Response, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import UpdateBase
+from typing import Any, List, Set
+
+
+router = APIRouter(prefix="/votes", tags=['Votes'])
+
+
+async def apply_votes(
+    db: AsyncSession, statement: UpdateBase, delta: int, user_id: int
+) -> Set[int]:
+    """ Runs a vote insert or delete returning post ids, applies delta to counters and stats. """
+
+    # Write-behind mode only writes the vote rows and the voter's stats, the counters and the
+    # owners' stats are updated in batches.
+    if settings.vote_write_behind:
+        post_ids = set(await db.scalars(statement))
+
+        if post_ids:
+            await db.execute(add_stats([(user_id, "votes_cast", delta * len(post_ids))]))
+
+        await db.commit()
+
+        for post_id in post_ids:
+            vote_counters.add(post_id, delta)
+
+        return post_ids
+
+    # Apply the delta in the database, in the same transaction as the vote rows.
+    rows = (await db.execute(count_votes(statement, delta))).all()
+
+    if rows:
+        await db.execute(vote_stats(user_id, (row.owner_id for row in rows), delta))
+
+    await db.commit()
+
+    return {row.id for row in rows}
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_writes)])
+async def add_vote(
+    vote: VoteCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> dict[str, str]:
+    """ Writes vote into database, given the current user and post. """
+
+    # Insert the vote only if the post exists and the user has not voted on it yet.
+    inserted_vote = insert_votes(current_user.id, [vote.post_id])
+
+    # Nothing was written, either because the post is missing or the vote already exists.
+    if not await apply_votes(db, inserted_vote, 1, current_user.id):
+        if not await db.scalar(select_existing_posts([vote.post_id])):
+            raise post_not_found(vote.post_id)
+
+        raise vote_exists(current_user.id, vote.post_id)
+
+    return {
+        "message": f"Successfully added vote on post {vote.post_id}."
+    }
+
+
+@router.post("/batch", response_model=List[BatchItemResult], dependencies=[Depends(limit_writes)])
+async def add_votes(
+    items: List[Any] = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> List[BatchItemResult]:
+    """ Writes a batch of votes in one multi-row insert, returns a result per vote. """
+
+    valid, results = validate_batch(items, VoteCreate)
+    post_ids = list(dict.fromkeys(vote.post_id for _, vote in valid))
+    voted = await apply_votes(
+        db, insert_votes(current_user.id, post_ids), 1, current_user.id
+    ) if post_ids else set()
+
+    # Tell missing posts apart from existing votes, only for the votes not written.
+    rejected = set(post_ids) - voted
+    existing = set(
+        await db.scalars(select_existing_posts(rejected))
+    ) if rejected else set()
+
+    results += batch_results(valid, voted, rejected, existing, current_user.id)
+
+    return sorted(results, key=lambda result: result.index)
+
+
+@router.delete("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_writes)])
+async def delete_vote(
+    vote: VoteCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+) -> Response:
+    """ Deletes vote from database, given the current user and post. """
+
+    deleted_vote = delete_votes(current_user.id, [vote.post_id])
+
+    # Nothing was deleted, either because the post is missing or the vote does not exist.
+    if not await apply_votes(db, deleted_vote, -1, current_user.id):
+        if not await db.scalar(select_existing_posts([vote.post_id])):
+            raise post_not_found(vote.post_id)
+
+        raise vote_not_found()
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,32 +1,72 @@
 from app.database.models import User
 from app.database.database import get_db
 from app.libs.oauth2 import create_access_token
-from app.libs.utils import verify
+from app.libs.ratelimit import limit_login
+from app.libs.utils import verify_and_update_async
 from .schemas.schemas import TokenResponse
 
 from fastapi import status, APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from typing import Optional
 
 
 router = APIRouter(prefix="/login", tags=['Authentication'])
 
 
-@router.post("/", response_model=TokenResponse)
-def login(
+def invalid_credentials() -> HTTPException:
+    """ Returns the exception raised when a login attempt fails. """
+
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Invalid credentials."
+    )
+
+
+def find_user(db: Session, email: str) -> Optional[User]:
+    """ Looks a user up by email, then hands the connection back to the pool. """
+
+    user = db.scalar(select(User).where(User.email == email))
+
+    # Release the connection before bcrypt runs, the check takes far longer than the query.
+    db.close()
+
+    return user
+
+
+def save_password(db: Session, user: User, new_hash: str) -> None:
+    """ Stores the rehashed password of a user found by find_user. """
+
+    user.password = new_hash
+    db.add(user)
+    db.commit()
+
+
+@router.post("/", response_model=TokenResponse, dependencies=[Depends(limit_login)])
+async def login(
     user_credentials: OAuth2PasswordRequestForm = Depends(), 
     db: Session = Depends(get_db)
 ) -> dict[str, str]:
     """ Verifies user email and password during login, returns token. """
 
-    user = db.query(User).filter(User.email == user_credentials.username).first()
+    # The queries run off the event loop, bcrypt runs in the hash pool without holding a thread.
+    user = await run_in_threadpool(find_user, db, user_credentials.username)
+
+    # Check if email exists in database.
+    if not user:
+        raise invalid_credentials()
+
+    verified, new_hash = await verify_and_update_async(user_credentials.password, user.password)
+
+    # Check if given password matches hashed password.
+    if not verified:
+        raise invalid_credentials()
 
-    # Check if email exists in database or if given password matches hashed password.
-    if not user or not verify(user_credentials.password, user.password):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
-            detail="Invalid credentials."
-        )
+    # Rehash the password when it was hashed with another cost factor.
+    if new_hash:
+        await run_in_threadpool(save_password, db, user, new_hash)
     
     access_token = create_access_token(data={"user_id": user.id})
 
@@ -0,0 +1,14 @@
+from app.libs.metrics import render
+
+from fastapi import APIRouter, Response
+
+
+router = APIRouter(tags=['Metrics'])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """ Exposes the application metrics in the Prometheus text format. """
+
+    # Served on the event loop, so scrapes still answer when the threadpool is saturated.
+    return Response(render(), media_type="text/plain; version=0.0.4")
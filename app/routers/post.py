@@ -1,128 +1,444 @@
+from app.database.config import settings
 from app.database.database import get_db
-from app.database.models import Post, User
+from app.database.models import Post, User, Vote
+from app.libs.batch import validate_batch
+from app.libs.http_cache import cache_headers, is_fresh, make_etag, not_modified
 from app.libs.oauth2 import get_current_user
-from .schemas.schemas import PostCreate, PostResponse
+from app.libs.pagination import decode_cursor, encode_cursor
+from app.libs.ratelimit import limit_writes
+from app.libs.replicas import get_read_db
+from app.libs.serializers import dump_export, dump_post, dump_posts, respond
+from app.libs.stats import add_stats
+from .schemas.schemas import BatchItemResult, FeedSort, PostCreate, PostResponse
 
-from fastapi import status, APIRouter, HTTPException, Response, Depends
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from datetime import datetime
+from fastapi import status, APIRouter, Body, HTTPException, Request, Response, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import (
+    cast, delete, func, insert, select, tuple_, update, Insert, Result, Row, Select, Update
+)
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+from sqlalchemy.orm import contains_eager, Session
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 
 router = APIRouter(prefix="/posts", tags=['Posts'])
 
+# Sort keys of each feed order with their cursor types, every order has an index on its keys.
+FEED_KEYS = {
+    FeedSort.hot: ((Post.hot, float), (Post.id, int)),
+    FeedSort.top: ((Post.votes, int), (Post.id, int)),
+    FeedSort.new: ((Post.created_at, datetime), (Post.id, int)),
+}
+
+
+def select_posts() -> Select:
+    """ Returns a select of posts and their row versions, loading owners in the same round trip. """
+
+    return select(Post, Post.xmin, User.xmin).join(Post.owner).options(
+        contains_eager(Post.owner)
+    )
+
+
+def select_post(id: int) -> Select:
+    """ Returns a select of a post with its owner, followed by their row versions. """
+
+    return select_posts().where(Post.id == id)
+
+
+def select_post_version(id: int) -> Select:
+    """ Returns a select of the row versions of a post, without loading the post itself. """
+
+    return select(Post.xmin, User.xmin).select_from(Post).join(Post.owner).where(Post.id == id)
+
+
+def post_etag(id: int, *versions: str) -> str:
+    """ Returns the entity tag of a post, given its row versions. """
+
+    return make_etag(id, *versions)
+
+
+def page_etag(rows: Sequence[Row], next_cursor: Optional[str]) -> str:
+    """ Returns the entity tag of a page of posts, given its rows and next cursor. """
+
+    return make_etag(*(f"{row[0].id}:{row[1]}:{row[2]}" for row in rows), next_cursor)
+
+
+def fetch_limit(limit: int) -> int:
+    """ Returns the rows to fetch for a page of limit posts, one extra to tell if there is more. """
+
+    # A page of no posts fetches nothing, and has no next page.
+    return limit + 1 if limit > 0 else 0
+
+
+def select_page(
+    limit: int, skip: int, search: Optional[str], cursor: Optional[str]
+) -> Select:
+    """ Returns a select of a page of posts followed by their sort keys, plus one extra row. """
+
+    statement = select_posts()
+    keys, types = [Post.created_at, Post.id], [datetime, int]
+
+    # Match against the indexed search vector and rank the results by relevance.
+    if search and search.strip():
+        ts_query = func.websearch_to_tsquery("english", search)
+        statement = statement.where(Post.search_vector.op("@@")(ts_query))
+        keys.insert(0, cast(func.ts_rank(Post.search_vector, ts_query), DOUBLE_PRECISION))
+        types.insert(0, float)
+
+    # Seek past the last row of the previous page instead of scanning skipped rows.
+    if cursor:
+        statement = statement.where(tuple_(*keys) < tuple_(*decode_cursor(cursor, *types)))
+
+    # Fetch one extra row to find out whether there is a next page.
+    return statement.add_columns(*keys).order_by(
+        *(key.desc() for key in keys)
+    ).offset(skip).limit(fetch_limit(limit))
+
+
+def select_feed(sort: FeedSort, limit: int, cursor: Optional[str]) -> Select:
+    """ Returns a select of a feed page followed by its sort keys, plus one extra row. """
+
+    keys, types = zip(*FEED_KEYS[sort])
+    statement = select_posts()
+
+    # Seek in the index of the sort keys, so a page never sorts the table.
+    if cursor:
+        statement = statement.where(tuple_(*keys) < tuple_(*decode_cursor(cursor, *types)))
+
+    return statement.add_columns(*keys).order_by(
+        *(key.desc() for key in keys)
+    ).limit(fetch_limit(limit))
+
+
+def select_export(
+    owner_id: Optional[int],
+    published: Optional[bool],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+    after_id: int
+) -> Select:
+    """ Returns a select of the flat rows of an export in id order, streamed in batches. """
+
+    statement = select(
+        Post.id, Post.title, Post.content, Post.published, Post.votes, Post.created_at,
+        User.id.label("owner_id"),
+        User.email.label("owner_email"),
+        User.created_at.label("owner_created_at")
+    ).join(Post.owner).where(Post.id > after_id)
+
+    if owner_id is not None:
+        statement = statement.where(Post.owner_id == owner_id)
+
+    if published is not None:
+        statement = statement.where(Post.published == published)
+
+    if created_after is not None:
+        statement = statement.where(Post.created_at >= created_after)
+
+    if created_before is not None:
+        statement = statement.where(Post.created_at < created_before)
+
+    # Rows are fetched from a server-side cursor one batch at a time, never all at once.
+    return statement.order_by(Post.id).execution_options(yield_per=settings.export_batch_size)
+
+
+def stream_export(result: Result) -> Iterator[bytes]:
+    """ Yields an export as NDJSON, one chunk per batch fetched from the cursor. """
+
+    for rows in result.partitions():
+        yield dump_export(rows)
+
+
+def split_page(rows: Sequence[Row], limit: int) -> Tuple[Sequence[Row], Optional[str]]:
+    """ Returns the rows of a page and the cursor of the next page, if there is one. """
+
+    next_cursor = None
+
+    if 0 < limit < len(rows):
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1][3:])
+
+    return rows, next_cursor
+
+
+def respond_page(request: Request, response: Response, rows: Sequence[Row], limit: int):
+    """ Returns a page of posts with its entity tag and next cursor, or 304 if it is fresh. """
+
+    rows, next_cursor = split_page(rows, limit)
+    etag = page_etag(rows, next_cursor)
+
+    # Skip serializing the page if the client already holds it.
+    if is_fresh(request, etag):
+        return not_modified(etag)
+
+    response.headers.update(cache_headers(etag))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return respond([row[0] for row in rows], dump_posts, response)
+
+
+def check_owner(id: int, owner_id: Optional[int], current_user: User) -> None:
+    """ Checks that a post exists and that the current user is its owner. """
+
+    # Check if post exists in the database.
+    if owner_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Post with id {id} does not exist."
+        )
+
+    # Check if current user is the owner of the post.
+    if owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to perform requested action."
+        )
+
+
+def post_not_found(id: int) -> HTTPException:
+    """ Returns the exception raised when a requested post does not exist. """
+
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Post with id {id} was not found."
+    )
+
+
+def select_post_owner(id: int) -> Select:
+    """ Returns a select of the owner id of a post, to check it before a write. """
+
+    return select(Post.owner_id).where(Post.id == id)
+
+
+def replace_post(id: int, post: PostCreate) -> Update:
+    """ Returns an update overwriting the fields of a post. """
+
+    return update(Post).where(Post.id == id).values(**post.dict())
+
+
+def select_deleted_post(id: int) -> Select:
+    """ Returns a select locking a post against new votes, with what its deletion uncounts. """
+
+    return select(Post.owner_id, Post.votes).where(Post.id == id).with_for_update()
+
+
+def select_voters(id: int) -> Select:
+    """ Returns a select of the users who voted on a post. """
+
+    return select(Vote.user_id).where(Vote.post_id == id)
+
+
+def delete_stats(owner_id: int, votes: int, voter_ids: Iterable[int]) -> Insert:
+    """ Returns an upsert taking a deleted post and its votes off the stats of its users. """
+
+    return add_stats([
+        (owner_id, "posts", -1),
+        (owner_id, "votes_received", -votes),
+        *((voter_id, "votes_cast", -1) for voter_id in voter_ids)
+    ])
+
+
+def insert_post(owner_id: int, post: PostCreate) -> Insert:
+    """ Returns an insert of a post returning its id. """
+
+    return insert(Post).values(owner_id=owner_id, **post.dict()).returning(Post.id)
+
+
+def reserve_post_ids(count: int) -> Select:
+    """ Returns a select that draws count ids from the posts sequence. """
+
+    return select(
+        func.nextval(func.pg_get_serial_sequence("posts", "id"))
+    ).select_from(func.generate_series(1, count))
+
+
+def insert_posts(
+    ids: Sequence[int], valid: List[Tuple[int, PostCreate]], owner_id: int
+) -> Tuple[Insert, List[BatchItemResult]]:
+    """ Returns a multi-row insert of a validated batch of posts and its results. """
+
+    statement = insert(Post).values([
+        {"id": id, "owner_id": owner_id, **post.dict()}
+        for id, (_, post) in zip(ids, valid)
+    ])
+    results = [
+        BatchItemResult(index=index, status_code=status.HTTP_201_CREATED, id=id)
+        for id, (index, _) in zip(ids, valid)
+    ]
+
+    return statement, results
+
 
 @router.get("/", response_model=List[PostResponse])
 def get_posts(
-    db: Session = Depends(get_db),
-    limit: int = 10, skip: int = 0, search: Optional[str] = ""
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    limit: int = 10, skip: int = 0, search: Optional[str] = "",
+    cursor: Optional[str] = None
 ) -> List[Post]:
-    """ Retrieves all posts from the database. """
+    """ Retrieves a page of posts from the database, newest first or by relevance. """
+
+    rows = db.execute(select_page(limit, skip, search, cursor)).all()
+
+    return respond_page(request, response, rows, limit)
+
+
+@router.get("/feed", response_model=List[PostResponse])
+def get_feed(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    sort: FeedSort = FeedSort.hot,
+    limit: int = 10,
+    cursor: Optional[str] = None
+) -> List[Post]:
+    """ Retrieves a page of the feed, hottest, most voted or newest posts first. """
+
+    rows = db.execute(select_feed(sort, limit, cursor)).all()
+
+    return respond_page(request, response, rows, limit)
 
-    posts = db.query(Post).filter(
-        Post.title.contains(search)
-    ).limit(limit).offset(skip).all()
-    
-    return posts
+
+@router.get("/export", response_class=StreamingResponse)
+def export_posts(
+    db: Session = Depends(get_read_db),
+    owner_id: Optional[int] = None,
+    published: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    after_id: int = 0
+) -> StreamingResponse:
+    """ Streams the posts matching the filters as NDJSON, in id order from after_id.
+
+    A client that disconnects stops the stream after the current batch, the session and its
+    connection are released as the response ends.
+    """
+
+    result = db.execute(
+        select_export(owner_id, published, created_after, created_before, after_id)
+    )
+
+    return StreamingResponse(stream_export(result), media_type="application/x-ndjson")
 
 
 @router.get("/{id}", response_model=PostResponse)
 def get_one_post(
-    id: int, 
-    db: Session = Depends(get_db),
+    id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
 ) -> Post:
     """ Retrieves a post from the database, given a post id. """
 
-    post = db.query(Post).filter(Post.id == id).first()
+    # Answer revalidations from the row versions alone, without loading the post.
+    if request.headers.get("if-none-match"):
+        versions = db.execute(select_post_version(id)).first()
+        etag = post_etag(id, *versions) if versions else None
+
+        if etag and is_fresh(request, etag):
+            return not_modified(etag)
+
+    row = db.execute(select_post(id)).first()
 
     # Check if post exists in the database.
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Post with id {id} was not found."
-        )
-    
-    return post
+    if not row:
+        raise post_not_found(id)
+
+    post, *versions = row
+    response.headers.update(cache_headers(post_etag(id, *versions)))
+
+    return respond(post, dump_post, response)
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=PostResponse)
+@router.post(
+    "/", status_code=status.HTTP_201_CREATED, response_model=PostResponse,
+    dependencies=[Depends(limit_writes)]
+)
 def create_post(
-    post: PostCreate, 
-    db: Session = Depends(get_db), 
+    post: PostCreate,
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Post:
     """ Writes a new entry into the database, given a post. """
 
-    new_post = Post(owner_id=current_user.id, **post.dict())
-
-    db.add(new_post)
+    new_post_id = db.scalar(insert_post(current_user.id, post))
+    db.execute(add_stats([(current_user.id, "posts", 1)]))
     db.commit()
-    db.refresh(new_post)
-    
-    return new_post
 
+    # Load the post together with its owner in one query.
+    new_post = db.scalar(select_post(new_post_id))
+
+    return respond(new_post, dump_post, status_code=status.HTTP_201_CREATED)
+
+
+@router.post("/batch", response_model=List[BatchItemResult], dependencies=[Depends(limit_writes)])
+def create_posts(
+    items: List[Any] = Body(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> List[BatchItemResult]:
+    """ Writes a batch of posts in one multi-row insert, returns a result per post. """
+
+    valid, results = validate_batch(items, PostCreate)
+
+    if valid:
+        # Reserve the ids up front so each result can be matched to its post.
+        ids = db.scalars(reserve_post_ids(len(valid))).all()
+        statement, created = insert_posts(ids, valid, current_user.id)
+
+        db.execute(statement)
+        db.execute(add_stats([(current_user.id, "posts", len(ids))]))
+        db.commit()
+        results += created
+
+    return sorted(results, key=lambda result: result.index)
 
-@router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
+
+@router.delete(
+    "/{id}", status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(limit_writes)]
+)
 def delete_post(
-    id: int, 
-    db: Session = Depends(get_db), 
+    id: int,
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Response:
     """ Deletes a post from the database, given a post id. """
 
-    # Retrieve post from database.
-    post_query = db.query(Post).filter(Post.id == id)
-    post = post_query.first()
+    post = db.execute(select_deleted_post(id)).first()
+    check_owner(id, post.owner_id if post else None, current_user)
+
+    # Take the post and the votes deleted with it off the stats of their users.
+    voter_ids = db.scalars(select_voters(id)).all()
+    db.execute(delete_stats(post.owner_id, post.votes, voter_ids))
 
-    # Check if post exists in the database.
-    if post == None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Post with id {id} does not exist."
-        )
-    
-    # Check if current user is the owner of the post.
-    if post.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
-            detail="Not authorized to perform requested action."
-        )
-    
     # Delete post and save changes.
-    post_query.delete(synchronize_session=False)
+    db.execute(delete(Post).where(Post.id == id))
     db.commit()
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-@router.put("/{id}", response_model=PostResponse)
+@router.put("/{id}", response_model=PostResponse, dependencies=[Depends(limit_writes)])
 def update_post(
-    id: int, 
+    id: int,
     updated_post: PostCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Post:
     """ Updates an entry from the database, given a post id and an updated post. """
 
-    # Retrieve post from database.
-    post_query = db.query(Post).filter(Post.id == id)
-    post = post_query.first()
+    owner_id = db.scalar(select_post_owner(id))
+    check_owner(id, owner_id, current_user)
 
-    # Check if post exists in the database.
-    if post == None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Post with id {id} does not exist."
-        )
-    
-    # Check if current user is the owner of the post.
-    if post.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
-            detail="Not authorized to perform requested action."
-        )
-    
     # Update post and save changes.
-    post_query.update(updated_post.dict(), synchronize_session=False)
+    db.execute(replace_post(id, updated_post))
     db.commit()
 
-    return post_query.first()
\ No newline at end of file
+    post = db.scalar(select_post(id).execution_options(populate_existing=True))
+
+    return respond(post, dump_post)
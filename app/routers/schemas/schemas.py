@@ -1,6 +1,7 @@
 from datetime import datetime
+from enum import Enum
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Any, List, Optional
 
 
 class UserBase(BaseModel):
@@ -19,6 +20,19 @@ class UserResponse(UserBase):
         orm_mode = True
 
 
+class UserStatsResponse(BaseModel):
+    posts: int
+    votes_received: int
+    votes_cast: int
+
+    class Config:
+        orm_mode = True
+
+
+class UserDetailResponse(UserResponse):
+    stats: UserStatsResponse
+
+
 class TokenData(BaseModel):
     id: Optional[str] = None
 
@@ -48,9 +62,64 @@ class PostResponse(PostBase):
         orm_mode = True
 
 
+class FeedSort(str, Enum):
+    hot = "hot"
+    top = "top"
+    new = "new"
+
+
 class VoteBase(BaseModel):
     post_id: int
 
 
 class VoteCreate(VoteBase):
-    pass
\ No newline at end of file
+    pass
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status_code: int
+    id: Optional[int] = None
+    detail: Optional[Any] = None
+
+
+class UserImport(UserCreate):
+    id: int
+    created_at: Optional[datetime] = None
+
+
+class PostImport(PostCreate):
+    id: int
+    owner_id: int
+    created_at: Optional[datetime] = None
+
+
+class VoteImport(VoteCreate):
+    user_id: int
+
+
+class ImportKind(str, Enum):
+    users = "users"
+    posts = "posts"
+    votes = "votes"
+
+
+class ImportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class ImportRejection(BaseModel):
+    line: int
+    detail: Any
+
+
+class ImportReport(BaseModel):
+    kind: ImportKind
+    read: int
+    imported: int
+    rejected: int
+    skipped: int
+    seconds: float
+    rows_per_second: float
+    rejections: List[ImportRejection]
@@ -1,58 +1,143 @@
 from app.database.database import get_db
-from app.database.models import User
-from app.libs.utils import hash
-from .schemas.schemas import UserCreate, UserResponse
+from app.database.models import User, UserStats
+from app.libs.http_cache import cache_headers, is_fresh, make_etag, not_modified
+from app.libs.ratelimit import limit_signup
+from app.libs.replicas import get_read_db
+from app.libs.serializers import dump_user, dump_user_detail, respond
+from app.libs.utils import hash_async
+from .schemas.schemas import UserCreate, UserDetailResponse, UserResponse
 
-from fastapi import status, APIRouter, HTTPException, Depends
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from fastapi import status, APIRouter, HTTPException, Request, Response, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, Select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, Session
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Union
 
 
 router = APIRouter(prefix="/users", tags=['Users'])
 
 
-@router.get("/{id}", response_model=UserResponse)
+def user_not_found() -> HTTPException:
+    """ Returns the exception raised when a requested user does not exist. """
+
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="User not found."
+    )
+
+
+def select_user(include_stats: bool) -> Select:
+    """ Returns a select of users with their row versions, joined to their stats if asked. """
+
+    if not include_stats:
+        return select(User, User.xmin)
+
+    return select(User, User.xmin, UserStats.xmin).outerjoin(User.stats).options(
+        contains_eager(User.stats)
+    )
+
+
+def with_stats(user: User) -> User:
+    """ Gives a user loaded without a stats row zeroed stats, so every path responds alike. """
+
+    # Set as if loaded, so the placeholder is never added to the session and written.
+    if user.stats is None:
+        set_committed_value(user, "stats", UserStats(posts=0, votes_received=0, votes_cast=0))
+
+    return user
+
+
+def select_user_version(id: int, include_stats: bool) -> Select:
+    """ Returns a select of the row versions a user's representation is built from. """
+
+    if not include_stats:
+        return select(User.xmin).where(User.id == id)
+
+    return select(User.xmin, UserStats.xmin).select_from(User).outerjoin(User.stats).where(
+        User.id == id
+    )
+
+
+def user_etag(id: int, *versions: str) -> str:
+    """ Returns the entity tag of a user, given its row versions. """
+
+    return make_etag(id, *versions)
+
+
+def email_in_use() -> HTTPException:
+    """ Returns the exception raised when a new user's email is already taken. """
+
+    return HTTPException(
+        status_code=status.HTTP_200_OK,
+        detail="Email is already in use."
+    )
+
+
+@router.get("/{id}", response_model=Union[UserDetailResponse, UserResponse])
 def get_one_user(
     id: int, 
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    include_stats: bool = False
 ) -> User:
-    """ Retrieves a single user from the database, given a user id. """
+    """ Retrieves a single user from the database, given a user id, with their stats if asked. """
+
+    # Answer revalidations from the row versions alone, without loading the user.
+    if request.headers.get("if-none-match"):
+        versions = db.execute(select_user_version(id, include_stats)).first()
+        etag = user_etag(id, *versions) if versions else None
 
-    user = db.query(User).filter(User.id == id).first()
+        if etag and is_fresh(request, etag):
+            return not_modified(etag)
+
+    row = db.execute(select_user(include_stats).where(User.id == id)).first()
 
     # Check if user exists in database.
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found."
-        )
-    
-    return user
+    if not row:
+        raise user_not_found()
 
+    user, *versions = row
+    response.headers.update(cache_headers(user_etag(id, *versions)))
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=UserResponse)
-def create_user(
-    user: UserCreate,
-    db: Session = Depends(get_db)
-) -> User:
-    """ Adds a new user into the database, given the email and password. """
+    if include_stats:
+        return respond(with_stats(user), dump_user_detail, response)
     
-    # Hash password.
-    user.password = hash(user.password)
+    return respond(user, dump_user, response)
 
-    new_user = User(**user.dict())
+
+def add_user(db: Session, user: UserCreate) -> User:
+    """ Writes a user with a hashed password into the database, if the email is available. """
+
+    # Start the user's stats along with the user, so profiles never lack them.
+    new_user = User(**user.dict(), stats=UserStats(posts=0, votes_received=0, votes_cast=0))
     db.add(new_user)
 
-    # Write into database if email is available.
     try:
         db.commit()
 
-    except SQLAlchemyError:
-        raise HTTPException(
-            status_code=status.HTTP_200_OK,
-            detail="Email is already in use."
-        )
+    except IntegrityError:
+        raise email_in_use()
     
     db.refresh(new_user)
 
-    return new_user
\ No newline at end of file
+    return new_user
+
+
+@router.post(
+    "/", status_code=status.HTTP_201_CREATED, response_model=UserResponse,
+    dependencies=[Depends(limit_signup)]
+)
+async def create_user(
+    user: UserCreate,
+    db: Session = Depends(get_db)
+) -> User:
+    """ Adds a new user into the database, given the email and password. """
+    
+    # Hash password in the hash pool, then write off the event loop.
+    user.password = await hash_async(user.password)
+    new_user = await run_in_threadpool(add_user, db, user)
+
+    return respond(new_user, dump_user, status_code=status.HTTP_201_CREATED)
\ No newline at end of file
@@ -1,91 +1,233 @@
+from app.database.config import settings
 from app.database.database import get_db
 from app.database.models import Post, User, Vote
+from app.libs.batch import validate_batch
+from app.libs.counters import vote_counters
 from app.libs.oauth2 import get_current_user
-from .schemas.schemas import VoteCreate
-
-from fastapi import status, APIRouter, HTTPException, Response, Depends
+from app.libs.ranking import hot_score
+from app.libs.ratelimit import limit_writes
+from app.libs.stats import add_stats
+from .schemas.schemas import BatchItemResult, VoteCreate
+
+from fastapi import status, APIRouter, Body, HTTPException, Response, Depends
+from sqlalchemy import delete, literal, select, update, Insert, Integer, Select, Update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import UpdateBase
+from typing import Any, Iterable, List, Set, Tuple
 
 
 router = APIRouter(prefix="/votes", tags=['Votes'])
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
+def post_not_found(post_id: int) -> HTTPException:
+    """ Returns the exception raised when a voted post does not exist. """
+
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Post with id {post_id} not found."
+    )
+
+
+def vote_exists(user_id: int, post_id: int) -> HTTPException:
+    """ Returns the exception raised when a user votes twice on a post. """
+
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"User {user_id} has already voted on post {post_id}."
+    )
+
+
+def vote_not_found() -> HTTPException:
+    """ Returns the exception raised when a retracted vote does not exist. """
+
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Vote does not exist."
+    )
+
+
+def select_existing_posts(post_ids: Iterable[int]) -> Select:
+    """ Returns a select of the ids of the given posts that exist. """
+
+    return select(Post.id).where(Post.id.in_(post_ids))
+
+
+def count_votes(statement: UpdateBase, delta: int) -> Update:
+    """ Returns an update applying delta to the counters and hot scores of the voted posts. """
+
+    changed_votes = statement.cte("changed_votes")
+
+    return update(Post).where(
+        Post.id.in_(select(changed_votes.c.post_id))
+    ).values(
+        votes=Post.votes + delta, hot=hot_score(Post.votes + delta, Post.created_at)
+    ).returning(Post.id, Post.owner_id).execution_options(
+        synchronize_session=False
+    )
+
+
+def vote_stats(user_id: int, owner_ids: Iterable[int], delta: int) -> Insert:
+    """ Returns an upsert applying delta to the stats of a voter and the owners of the posts. """
+
+    owner_ids = list(owner_ids)
+
+    return add_stats([
+        (user_id, "votes_cast", delta * len(owner_ids)),
+        *((owner_id, "votes_received", delta) for owner_id in owner_ids)
+    ])
+
+
+def apply_votes(db: Session, statement: UpdateBase, delta: int, user_id: int) -> Set[int]:
+    """ Runs a vote insert or delete returning post ids, applies delta to counters and stats. """
+
+    # Write-behind mode only writes the vote rows and the voter's stats, the counters and the
+    # owners' stats are updated in batches.
+    if settings.vote_write_behind:
+        post_ids = set(db.scalars(statement))
+
+        if post_ids:
+            db.execute(add_stats([(user_id, "votes_cast", delta * len(post_ids))]))
+
+        db.commit()
+
+        for post_id in post_ids:
+            vote_counters.add(post_id, delta)
+
+        return post_ids
+
+    # Apply the delta in the database, in the same transaction as the vote rows.
+    rows = db.execute(count_votes(statement, delta)).all()
+
+    if rows:
+        db.execute(vote_stats(user_id, (row.owner_id for row in rows), delta))
+
+    db.commit()
+
+    return {row.id for row in rows}
+
+
+def insert_votes(user_id: int, post_ids: List[int]) -> UpdateBase:
+    """ Returns an insert of the votes of a user on the given posts that exist. """
+
+    return insert(Vote).from_select(
+        ["user_id", "post_id"],
+        select(literal(user_id, Integer), Post.id).where(Post.id.in_(post_ids))
+    ).on_conflict_do_nothing().returning(Vote.post_id)
+
+
+def delete_votes(user_id: int, post_ids: List[int]) -> UpdateBase:
+    """ Returns a delete of the votes of a user on the given posts. """
+
+    # A Core delete, since ORM-enabled deletes cannot be nested in a CTE.
+    votes = Vote.__table__
+
+    return delete(votes).where(
+        votes.c.user_id == user_id,
+        votes.c.post_id.in_(post_ids)
+    ).returning(votes.c.post_id)
+
+
+def batch_results(
+    valid: List[Tuple[int, VoteCreate]],
+    voted: Set[int],
+    rejected: Set[int],
+    existing: Set[int],
+    user_id: int
+) -> List[BatchItemResult]:
+    """ Returns the result of every valid vote of a batch, given the posts voted and rejected. """
+
+    results = []
+    voted = set(voted)
+
+    for index, vote in valid:
+        if vote.post_id in voted:
+            voted.remove(vote.post_id)
+            results.append(BatchItemResult(
+                index=index, status_code=status.HTTP_201_CREATED, id=vote.post_id
+            ))
+
+        # Either the vote already existed or it was repeated within the batch.
+        elif vote.post_id in existing or vote.post_id not in rejected:
+            results.append(BatchItemResult(
+                index=index,
+                status_code=status.HTTP_409_CONFLICT,
+                id=vote.post_id,
+                detail=vote_exists(user_id, vote.post_id).detail
+            ))
+
+        else:
+            results.append(BatchItemResult(
+                index=index,
+                status_code=status.HTTP_404_NOT_FOUND,
+                id=vote.post_id,
+                detail=post_not_found(vote.post_id).detail
+            ))
+
+    return results
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_writes)])
 def add_vote(
-    vote: VoteCreate, 
+    vote: VoteCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> dict[str, str]:
     """ Writes vote into database, given the current user and post. """
 
-    # Check if post exists in database.
-    post_query = db.query(Post).filter(Post.id == vote.post_id)
-    post = post_query.first()
+    # Insert the vote only if the post exists and the user has not voted on it yet.
+    inserted_vote = insert_votes(current_user.id, [vote.post_id])
 
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Post with id {vote.post_id} not found."
-        )
+    # Nothing was written, either because the post is missing or the vote already exists.
+    if not apply_votes(db, inserted_vote, 1, current_user.id):
+        if not db.scalar(select_existing_posts([vote.post_id])):
+            raise post_not_found(vote.post_id)
 
-    # Retrieve data from votes table.
-    vote_query = db.query(Vote).filter(
-        Vote.user_id == current_user.id,
-        Vote.post_id == vote.post_id
-    )
-    found_vote = vote_query.first()
-    
-    # Add vote if it does not already exist in database.
-    if found_vote:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"User {current_user.id} has already voted on post {vote.post_id}."
-        )
-    
-    new_vote = Vote(user_id=current_user.id, post_id=vote.post_id)
-    db.add(new_vote)
-    post_query.update({Post.votes: post.votes+1}, synchronize_session=False)
-    db.commit()
+        raise vote_exists(current_user.id, vote.post_id)
 
     return {
         "message": f"Successfully added vote on post {vote.post_id}."
     }
 
 
-@router.delete("/", status_code=status.HTTP_201_CREATED)
+@router.post("/batch", response_model=List[BatchItemResult], dependencies=[Depends(limit_writes)])
+def add_votes(
+    items: List[Any] = Body(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> List[BatchItemResult]:
+    """ Writes a batch of votes in one multi-row insert, returns a result per vote. """
+
+    valid, results = validate_batch(items, VoteCreate)
+    post_ids = list(dict.fromkeys(vote.post_id for _, vote in valid))
+    voted = apply_votes(
+        db, insert_votes(current_user.id, post_ids), 1, current_user.id
+    ) if post_ids else set()
+
+    # Tell missing posts apart from existing votes, only for the votes not written.
+    rejected = set(post_ids) - voted
+    existing = set(db.scalars(select_existing_posts(rejected))) if rejected else set()
+
+    results += batch_results(valid, voted, rejected, existing, current_user.id)
+
+    return sorted(results, key=lambda result: result.index)
+
+
+@router.delete("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_writes)])
 def delete_vote(
-    vote: VoteCreate, 
+    vote: VoteCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Response:
     """ Deletes vote from database, given the current user and post. """
 
-    # Check if post exists in database.
-    post_query = db.query(Post).filter(Post.id == vote.post_id)
-    post = post_query.first()
+    deleted_vote = delete_votes(current_user.id, [vote.post_id])
 
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Post with id {vote.post_id} not found."
-        )
+    # Nothing was deleted, either because the post is missing or the vote does not exist.
+    if not apply_votes(db, deleted_vote, -1, current_user.id):
+        if not db.scalar(select_existing_posts([vote.post_id])):
+            raise post_not_found(vote.post_id)
 
-    # Retrieve data from votes table.
-    vote_query = db.query(Vote).filter(
-        Vote.user_id == current_user.id,
-        Vote.post_id == vote.post_id
-    )
-    found_vote = vote_query.first()
-
-    # Delete vote if it exists in database.
-    if not found_vote:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Vote does not exist."
-        )
-    
-    vote_query.delete(synchronize_session=False)
-    post_query.update({Post.votes: post.votes-1}, synchronize_session=False)
-    db.commit()
+        raise vote_not_found()
 
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,45 @@
+from .common import create_post, create_users, make_client, run, server
+
+from argparse import ArgumentParser
+
+import asyncio
+import json
+
+
+async def reads(base_url: str, requests: int, concurrency: int, post_ids: list) -> dict:
+    """ Sends list and detail reads to a server, returns the summary. """
+
+    async with make_client(base_url, concurrency) as client:
+        def read(i: int):
+            if i % 2:
+                return lambda: client.get("/posts/")
+
+            return lambda: client.get(f"/posts/{post_ids[i % len(post_ids)]}")
+
+        return await run((read(i) for i in range(requests)), concurrency)
+
+
+def main() -> None:
+    """ Compares read throughput of the sync and async database stacks at high concurrency. """
+
+    parser = ArgumentParser(prog="python -m benchmarks.async_stack")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    owner_id = create_users(1)[0]
+    post_ids = [create_post(owner_id) for _ in range(100)]
+    results = []
+
+    for database_async in (False, True):
+        with server(args.port, DATABASE_ASYNC=str(database_async).lower()) as base_url:
+            summary = asyncio.run(reads(base_url, args.requests, args.concurrency, post_ids))
+            summary["database_async"] = database_async
+            results.append(summary)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
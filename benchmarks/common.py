@@ -0,0 +1,171 @@
+from app.database.config import settings
+from app.database.database import SessionLocal
+from app.database.models import Post, User
+from app.libs.oauth2 import create_access_token
+from app.libs.utils import hash
+from app.main import create_app
+
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from httpx import AsyncClient, Limits
+from sqlalchemy import insert
+from time import perf_counter
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+from uuid import uuid4
+
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+BENCH_PASSWORD = "benchmark"
+
+
+@lru_cache(maxsize=None)
+def local_app():
+    """ Returns the application the in-process clients call, built once. """
+
+    # The load comes from one address and a few users, it measures the routes, not the limits.
+    settings.rate_limit_enabled = False
+
+    return create_app()
+
+
+def make_client(
+    base_url: Optional[str] = None, connections: int = 100, timeout: float = 30.0
+) -> AsyncClient:
+    """ Returns an HTTP client for a running server, or one that calls the app in-process. """
+
+    if base_url:
+        return AsyncClient(
+            base_url=base_url,
+            limits=Limits(max_connections=connections, max_keepalive_connections=connections),
+            timeout=timeout
+        )
+
+    return AsyncClient(app=local_app(), base_url="http://bench", timeout=timeout)
+
+
+@asynccontextmanager
+async def app_lifespan(base_url: Optional[str] = None) -> AsyncIterator[None]:
+    """ Runs the startup and shutdown of the in-process app around a load, as a server would. """
+
+    # A running server went through its own lifespan already.
+    if base_url:
+        yield
+        return
+
+    app = local_app()
+
+    async with app.router.lifespan_context(app):
+        yield
+
+
+def create_users(count: int) -> List[int]:
+    """ Inserts users sharing one password hash, returns their ids. """
+
+    password = hash(BENCH_PASSWORD)
+    prefix = uuid4().hex[:8]
+
+    with SessionLocal() as db:
+        ids = db.scalars(
+            insert(User).returning(User.id),
+            [
+                {"email": f"bench-{prefix}-{i}@example.com", "password": password}
+                for i in range(count)
+            ]
+        ).all()
+        db.commit()
+
+    return list(ids)
+
+
+def create_post(owner_id: int) -> int:
+    """ Inserts a post, returns its id. """
+
+    with SessionLocal() as db:
+        post_id = db.scalar(
+            insert(Post)
+            .values(title="Benchmark", content="Benchmark post.", owner_id=owner_id)
+            .returning(Post.id)
+        )
+        db.commit()
+
+    return post_id
+
+
+def auth_headers(user_id: int) -> Dict[str, str]:
+    """ Returns the authorization header of a user, without going through login. """
+
+    return {"Authorization": f"Bearer {create_access_token({'user_id': user_id})}"}
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """ Returns throughput and latency percentiles, in milliseconds. """
+
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50": round(cuts[49] * 1000, 2),
+        "p95": round(cuts[94] * 1000, 2),
+        "p99": round(cuts[98] * 1000, 2),
+    }
+
+
+async def run(
+    calls: Iterable[Callable[[], Awaitable[object]]],
+    concurrency: int
+) -> Dict[str, float]:
+    """ Awaits every call with bounded concurrency, returns their summary. """
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def timed(call: Callable[[], Awaitable[object]]) -> None:
+        async with semaphore:
+            start = perf_counter()
+            await call()
+            latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(timed(call) for call in calls))
+
+    return summarize(latencies, perf_counter() - start)
+
+
+@contextmanager
+def server(port: int, *args: str, **env: str) -> Iterator[str]:
+    """ Runs the application with `python -m app serve`, given extra arguments and settings. """
+
+    # One worker unless the arguments ask for more.
+    command = [
+        sys.executable, "-m", "app", "serve",
+        "--port", str(port), "--workers", "1", "--log-level", "warning", *args
+    ]
+    process = subprocess.Popen(
+        command, env={**os.environ, "RATE_LIMIT_ENABLED": "false", **env}
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        # Wait until the server answers.
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"{base_url}/")
+                break
+
+            except OSError:
+                time.sleep(0.1)
+
+        yield base_url
+
+    finally:
+        process.terminate()
+        process.wait()
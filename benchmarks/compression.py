@@ -0,0 +1,104 @@
+from app.libs.compression import CompressionMiddleware, ENCODERS
+from .serialization import fast_render, make_page
+
+from argparse import ArgumentParser
+from fastapi.responses import Response
+from time import process_time
+from typing import Dict, List
+
+import asyncio
+import json
+
+
+# Levels measured for each coding, from the fastest to the smallest output.
+LEVELS = {
+    "gzip": [1, 6, 9],
+    "br": [1, 4, 6, 11],
+    "zstd": [1, 3, 9, 19],
+}
+
+
+async def respond(app, coding: str) -> int:
+    """ Sends a request accepting coding through the middleware, returns the bytes sent back. """
+
+    sent = 0
+
+    async def receive() -> dict:
+        return {"type": "http.request"}
+
+    async def send(message: dict) -> None:
+        nonlocal sent
+
+        if message["type"] == "http.response.start":
+            sent += sum(len(name) + len(value) + 4 for name, value in message["headers"])
+
+        else:
+            sent += len(message.get("body", b""))
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "headers": [(b"accept-encoding", coding.encode())],
+    }
+    await app(scope, receive, send)
+
+    return sent
+
+
+def measure(body: bytes, coding: str, level: int, rounds: int) -> Dict[str, float]:
+    """ Returns the bytes on the wire and the CPU time per response of a body at a level. """
+
+    async def endpoint(scope: dict, receive, send) -> None:
+        await Response(body, media_type="application/json")(scope, receive, send)
+
+    app = CompressionMiddleware(endpoint, minimum_size=0, levels={coding: level})
+
+    async def run() -> Dict[str, float]:
+        start = process_time()
+
+        for _ in range(rounds):
+            sent = await respond(app, coding)
+
+        return {
+            "bytes": sent,
+            "ratio": round(len(body) / sent, 2),
+            "cpu_us": round((process_time() - start) / rounds * 1e6, 1),
+        }
+
+    return asyncio.run(run())
+
+
+def main() -> None:
+    """ Reports the wire size and CPU cost of compressing post pages at every level. """
+
+    parser = ArgumentParser(prog="python -m benchmarks.compression")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--codings", nargs="+", choices=list(LEVELS), default=list(ENCODERS))
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    results: Dict[str, dict] = {}
+
+    for size in args.sizes:
+        body = fast_render(make_page(size))
+        report: Dict[str, List[dict]] = {
+            "identity": [measure(body, "identity", 0, args.rounds)]
+        }
+
+        for coding in args.codings:
+            # Codings whose package is not installed cannot be negotiated.
+            if coding not in ENCODERS:
+                continue
+
+            report[coding] = [
+                {"level": level, **measure(body, coding, level, args.rounds)}
+                for level in LEVELS[coding]
+            ]
+
+        results[f"{size} posts"] = report
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+from app.database.config import settings
+from app.database.database import SessionLocal
+from app.database.models import Post, User
+from app.libs.pagination import encode_cursor
+from .common import (
+    BENCH_PASSWORD, app_lifespan, auth_headers, create_post as insert_post, create_users,
+    make_client, server, summarize
+)
+
+from argparse import ArgumentParser
+from contextlib import nullcontext
+from httpx import AsyncClient
+from multiprocessing import get_context
+from sqlalchemy import select
+from time import perf_counter, time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import asyncio
+import json
+import sys
+
+
+Call = Callable[[AsyncClient, dict, dict, int], Awaitable[int]]
+SEARCH_TERMS = ["cats", "dogs", "postgres", "python fastapi", "latency OR throughput"]
+IMPORT_BATCH = 10
+
+
+def user_of(context: dict, i: int) -> dict:
+    return context["users"][i % len(context["users"])]
+
+
+def voted_post(context: dict, i: int) -> int:
+    # Request i of a user votes on a different post than its other requests.
+    return context["posts"][(i // len(context["users"])) % len(context["posts"])]
+
+
+async def create_user(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    email = f"load-{context['run']}-{i}@example.com"
+    response = await client.post("/users/", json={"email": email, "password": BENCH_PASSWORD})
+
+    return response.status_code
+
+
+async def get_user(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    return (await client.get(f"/users/{user_of(context, i)['id']}")).status_code
+
+
+async def user_profile(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    response = await client.get(
+        f"/users/{user_of(context, i)['id']}", params={"include_stats": "true"}
+    )
+
+    return response.status_code
+
+
+async def login(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    form = {"username": user_of(context, i)["email"], "password": BENCH_PASSWORD}
+
+    return (await client.post("/login/", data=form)).status_code
+
+
+async def create_post(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    response = await client.post(
+        "/posts/",
+        json={"title": f"Load post {i}", "content": "Created by the load generator."},
+        headers=user_of(context, i)["headers"]
+    )
+
+    if response.status_code == 201:
+        state.setdefault("created", {})[i] = response.json()["id"]
+
+    return response.status_code
+
+
+async def batch_posts(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    response = await client.post(
+        "/posts/batch",
+        json=[{"title": f"Batch post {i}-{n}", "content": "Batched."} for n in range(10)],
+        headers=user_of(context, i)["headers"]
+    )
+
+    if response.status_code == 200:
+        state.setdefault("batched", {})[i] = [result["id"] for result in response.json()]
+
+    return response.status_code
+
+
+async def list_posts(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    return (await client.get("/posts/", params={"limit": 20})).status_code
+
+
+async def page_posts(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    params = {"limit": 20, "cursor": context["cursor"]}
+
+    return (await client.get("/posts/", params=params)).status_code
+
+
+async def search_posts(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    params = {"limit": 20, "search": SEARCH_TERMS[i % len(SEARCH_TERMS)]}
+
+    return (await client.get("/posts/", params=params)).status_code
+
+
+async def hot_feed(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    return (await client.get("/posts/feed", params={"sort": "hot", "limit": 20})).status_code
+
+
+async def top_feed(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    return (await client.get("/posts/feed", params={"sort": "top", "limit": 20})).status_code
+
+
+async def export_posts(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    # Export the posts the reads pick from, about a thousand of the newest.
+    params = {"after_id": min(context["posts"]) - 1}
+
+    return (await client.get("/posts/export", params=params)).status_code
+
+
+async def import_posts(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    first_id = context["import_id"] + i * IMPORT_BATCH
+    owner_id = user_of(context, i)["id"]
+    body = "".join(
+        json.dumps({"id": id, "owner_id": owner_id, "title": f"Imported post {id}", "content": "."})
+        + "\n"
+        for id in range(first_id, first_id + IMPORT_BATCH)
+    )
+    response = await client.post(
+        "/admin/import/posts", content=body, headers=context["admin_headers"]
+    )
+
+    return response.status_code
+
+
+async def get_post(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    post_id = context["posts"][i % len(context["posts"])]
+
+    return (await client.get(f"/posts/{post_id}")).status_code
+
+
+async def update_post(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    response = await client.put(
+        f"/posts/{state['created'][i]}",
+        json={"title": f"Updated post {i}", "content": "Updated by the load generator."},
+        headers=user_of(context, i)["headers"]
+    )
+
+    return response.status_code
+
+
+async def add_vote(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    response = await client.post(
+        "/votes/", json={"post_id": voted_post(context, i)}, headers=user_of(context, i)["headers"]
+    )
+
+    return response.status_code
+
+
+async def batch_votes(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    response = await client.post(
+        "/votes/batch",
+        json=[{"post_id": post_id} for post_id in state["batched"][i]],
+        headers=user_of(context, i)["headers"]
+    )
+
+    return response.status_code
+
+
+async def delete_vote(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    response = await client.request(
+        "DELETE", "/votes/",
+        json={"post_id": voted_post(context, i)},
+        headers=user_of(context, i)["headers"]
+    )
+
+    return response.status_code
+
+
+async def delete_post(client: AsyncClient, context: dict, state: dict, i: int) -> int:
+    response = await client.delete(
+        f"/posts/{state['created'][i]}", headers=user_of(context, i)["headers"]
+    )
+
+    return response.status_code
+
+
+# Every route of app/routers with its expected status, in the order they are driven.
+ROUTES: Dict[str, Tuple[Call, int]] = {
+    "create_user": (create_user, 201),
+    "get_user": (get_user, 200),
+    "user_profile": (user_profile, 200),
+    "login": (login, 200),
+    "create_post": (create_post, 201),
+    "batch_posts": (batch_posts, 200),
+    "list_posts": (list_posts, 200),
+    "page_posts": (page_posts, 200),
+    "search_posts": (search_posts, 200),
+    "hot_feed": (hot_feed, 200),
+    "top_feed": (top_feed, 200),
+    "export_posts": (export_posts, 200),
+    "import_posts": (import_posts, 200),
+    "get_post": (get_post, 200),
+    "update_post": (update_post, 200),
+    "add_vote": (add_vote, 201),
+    "batch_votes": (batch_votes, 200),
+    "delete_vote": (delete_vote, 204),
+    "delete_post": (delete_post, 204),
+}
+
+# Routes that act on what an earlier route created.
+REQUIRES = {
+    "update_post": "create_post",
+    "delete_post": "create_post",
+    "batch_votes": "batch_posts",
+    "delete_vote": "add_vote",
+}
+
+
+def prepare(users: int) -> dict:
+    """ Creates the users the load runs as and picks the posts it reads, returns the context. """
+
+    user_ids = create_users(users)
+
+    # Imports run as a configured administrator, or else as the first user, made one for the
+    # in-process app and the servers started here.
+    if not settings.admin_user_ids:
+        settings.admin_user_ids = [user_ids[0]]
+
+    admin_id = settings.admin_user_ids[0]
+
+    # Guarantee there is something to read even on an empty database.
+    insert_post(user_ids[0])
+
+    with SessionLocal() as db:
+        emails = dict(db.execute(select(User.id, User.email).where(User.id.in_(user_ids))).all())
+        posts = db.scalars(select(Post.id).order_by(Post.id.desc()).limit(1000)).all()
+        last = db.execute(
+            select(Post.created_at, Post.id)
+            .order_by(Post.created_at.desc(), Post.id.desc())
+            .offset(min(len(posts), 1000) - 1).limit(1)
+        ).first()
+
+    return {
+        "run": uuid4().hex[:8],
+        "users": [
+            {"id": id, "email": emails[id], "headers": auth_headers(id)} for id in user_ids
+        ],
+        "posts": list(posts),
+        "cursor": encode_cursor(*last),
+        "admin_id": admin_id,
+        "admin_headers": auth_headers(admin_id),
+        # Imported ids start well past the posts created meanwhile through the sequence.
+        "import_id": posts[0] + 1000000,
+    }
+
+
+async def drive(
+    context: dict,
+    routes: List[str],
+    indices: range,
+    concurrency: int,
+    base_url: Optional[str] = None,
+    barrier=None
+) -> Dict[str, dict]:
+    """ Sends every request of every route in turn, returns the raw samples of each route. """
+
+    samples = {}
+    state: dict = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with app_lifespan(base_url), make_client(base_url, concurrency) as client:
+        for route in routes:
+            call, expected = ROUTES[route]
+            latencies: List[float] = []
+            errors = 0
+
+            async def timed(i: int) -> None:
+                nonlocal errors
+
+                async with semaphore:
+                    start = perf_counter()
+
+                    try:
+                        status_code = await call(client, context, state, i)
+
+                    except Exception:
+                        status_code = None
+
+                    latencies.append(perf_counter() - start)
+                    errors += status_code != expected
+
+            # Keep worker processes on the same route, so each phase is measured alone.
+            if barrier is not None:
+                await asyncio.to_thread(barrier.wait)
+
+            started = time()
+            await asyncio.gather(*(timed(i) for i in indices))
+            samples[route] = {
+                "latencies": latencies, "errors": errors, "started": started, "ended": time()
+            }
+
+    return samples
+
+
+def worker(context, routes, indices, concurrency, base_url, barrier, results) -> None:
+    results.put(asyncio.run(drive(context, routes, indices, concurrency, base_url, barrier)))
+
+
+def merge(samples: List[Dict[str, dict]], routes: List[str]) -> Dict[str, dict]:
+    """ Merges the samples of every worker, returns the summary of each route. """
+
+    summaries = {}
+
+    for route in routes:
+        parts = [sample[route] for sample in samples]
+        latencies = [latency for part in parts for latency in part["latencies"]]
+        elapsed = max(part["ended"] for part in parts) - min(part["started"] for part in parts)
+
+        summaries[route] = summarize(latencies, elapsed)
+        summaries[route]["errors"] = sum(part["errors"] for part in parts)
+
+    return summaries
+
+
+def load(
+    context: dict,
+    routes: List[str],
+    requests: int,
+    concurrency: int,
+    workers: int,
+    base_url: Optional[str]
+) -> Dict[str, dict]:
+    """ Drives the routes in-process, or over HTTP from several worker processes. """
+
+    if base_url is None:
+        return merge([asyncio.run(drive(context, routes, range(requests), concurrency))], routes)
+
+    spawn = get_context("spawn")
+    barrier = spawn.Barrier(workers)
+    results = spawn.Queue()
+    processes = [
+        spawn.Process(
+            target=worker,
+            args=(
+                context, routes, range(w, requests, workers), concurrency, base_url,
+                barrier, results
+            )
+        )
+        for w in range(workers)
+    ]
+
+    for process in processes:
+        process.start()
+
+    samples = [results.get() for _ in processes]
+
+    for process in processes:
+        process.join()
+
+    return merge(samples, routes)
+
+
+def compare(routes: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> dict:
+    """ Compares route summaries to a baseline report, flags throughput or p95 regressions. """
+
+    comparison = {}
+
+    for route, summary in routes.items():
+        before = baseline.get("routes", {}).get(route)
+
+        if not before:
+            continue
+
+        throughput = summary["throughput"] / before["throughput"] - 1
+        p95 = summary["p95"] / before["p95"] - 1 if before["p95"] else 0.0
+        comparison[route] = {
+            "throughput_change": round(throughput * 100, 1),
+            "p95_change": round(p95 * 100, 1),
+            "regressed": throughput < -tolerance or p95 > tolerance,
+        }
+
+    return comparison
+
+
+def main() -> None:
+    """ Load tests every route, writes a JSON report and compares it to a baseline. """
+
+    parser = ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight per worker")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--http", action="store_true", help="load a uvicorn server over HTTP")
+    parser.add_argument(
+        "--url", help="load an already running server instead, importing as its first admin"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="load generator processes")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare against this saved report")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    routes = [route for route in ROUTES if route in args.routes]
+    missing = {
+        REQUIRES[route] for route in routes if route in REQUIRES and REQUIRES[route] not in routes
+    }
+
+    if missing:
+        parser.error(f"the selected routes also need {', '.join(sorted(missing))}")
+
+    context = prepare(args.users)
+
+    if args.url:
+        target = nullcontext(args.url)
+
+    elif args.http:
+        target = server(
+            args.port, "--workers", str(args.server_workers),
+            ADMIN_USER_IDS=json.dumps([context["admin_id"]])
+        )
+
+    else:
+        target = nullcontext(None)
+
+    with target as base_url:
+        summaries = load(
+            context, routes, args.requests, args.concurrency,
+            args.workers if base_url else 1, base_url
+        )
+
+    report = {
+        "target": base_url or "asgi",
+        "workers": args.workers if base_url else 1,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "routes": summaries,
+    }
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["comparison"] = compare(summaries, json.load(file), args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    print(json.dumps(report, indent=2))
+
+    # Fail the run on a regression, so it can gate a deploy.
+    if any(route["regressed"] for route in report.get("comparison", {}).values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
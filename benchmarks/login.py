@@ -0,0 +1,56 @@
+from app.database.database import SessionLocal
+from app.database.models import User
+from .common import BENCH_PASSWORD, create_post, create_users, make_client, run, server
+
+from argparse import ArgumentParser
+from sqlalchemy import select
+
+import asyncio
+import json
+
+
+async def storm(
+    base_url: str, emails: list, post_id: int, logins: int, reads: int, concurrency: int
+) -> dict:
+    """ Runs a login storm and a stream of post reads side by side, returns both summaries. """
+
+    async with make_client(base_url, 2 * concurrency) as client:
+        def login(i: int):
+            form = {"username": emails[i % len(emails)], "password": BENCH_PASSWORD}
+
+            return lambda: client.post("/login/", data=form)
+
+        login_summary, read_summary = await asyncio.gather(
+            run((login(i) for i in range(logins)), concurrency),
+            run((lambda: client.get(f"/posts/{post_id}") for _ in range(reads)), concurrency)
+        )
+
+    return {"login": login_summary, "read_during_logins": read_summary}
+
+
+def main() -> None:
+    """ Benchmarks login throughput and the read latency of other endpoints during a login storm. """
+
+    parser = ArgumentParser(prog="python -m benchmarks.login")
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    user_ids = create_users(50)
+    post_id = create_post(user_ids[0])
+
+    with SessionLocal() as db:
+        emails = db.scalars(select(User.email).where(User.id.in_(user_ids))).all()
+
+    with server(args.port) as base_url:
+        summary = asyncio.run(
+            storm(base_url, emails, post_id, args.logins, args.reads, args.concurrency)
+        )
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+from app.database.database import SessionLocal
+from app.database.models import Post, User, Vote
+from app.libs.importer import recount_posts
+from app.libs.pagination import encode_cursor
+from app.libs.stats import add_stats, recount_stats
+from app.routers.post import (
+    insert_post, insert_posts, replace_post, reserve_post_ids, select_deleted_post,
+    select_export, select_feed, select_page, select_post, select_post_owner, select_post_version,
+    select_voters
+)
+from app.routers.schemas.schemas import FeedSort, PostCreate
+from app.routers.user import select_user, select_user_version
+from app.routers.vote import (
+    count_votes, delete_votes, insert_votes, select_existing_posts, vote_stats
+)
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from sqlalchemy import literal, select, text, Executable
+from sqlalchemy.orm import Session
+from typing import Dict, Iterator, List
+
+import json
+import sys
+
+
+# Tables every query must reach through an index, however few rows they hold.
+INDEXED_TABLES = {"posts", "votes"}
+
+# Values matching no row, to explain the queries against an empty database.
+PLACEHOLDERS = {
+    "voter_id": 0,
+    "post_id": 0,
+    "owner_id": 0,
+    "email": "",
+    "created_at": datetime(2000, 1, 1, tzinfo=timezone.utc),
+    "hot": 0.0,
+    "votes": 0,
+}
+
+
+def sample(db: Session) -> dict:
+    """ Picks a vote, its post, voter and post owner to fill in the queries with, or the
+    placeholders if there are no votes yet.
+    """
+
+    vote = db.execute(select(Vote.user_id, Vote.post_id).limit(1)).first()
+
+    if vote is None:
+        return PLACEHOLDERS
+
+    post = db.get(Post, vote.post_id)
+
+    return {
+        "voter_id": vote.user_id,
+        "post_id": post.id,
+        "owner_id": post.owner_id,
+        "email": db.get(User, post.owner_id).email,
+        "created_at": post.created_at,
+        "hot": post.hot,
+        "votes": post.votes,
+    }
+
+
+def queries(values: dict) -> Dict[str, Executable]:
+    """ Returns the statements the routers and maintenance commands run, by name. """
+
+    post_id, owner_id, voter_id = values["post_id"], values["owner_id"], values["voter_id"]
+    created_at = values["created_at"]
+    post = PostCreate(title="Explained", content="Never written.")
+    post_ids = [post_id, post_id + 1, post_id + 2]
+    batch = list(enumerate([post] * len(post_ids)))
+    feed_cursors = {
+        FeedSort.hot: encode_cursor(values["hot"], post_id),
+        FeedSort.top: encode_cursor(values["votes"], post_id),
+        FeedSort.new: encode_cursor(created_at, post_id),
+    }
+
+    return {
+        "login": select(User).where(User.email == values["email"]),
+        "get_user": select_user(False).where(User.id == owner_id),
+        "user_profile": select_user(True).where(User.id == owner_id),
+        "user_version": select_user_version(owner_id, True),
+        # Also the reloads of create_post and update_post.
+        "get_post": select_post(post_id),
+        "post_version": select_post_version(post_id),
+        "create_post": insert_post(owner_id, post),
+        "post_stats": add_stats([(owner_id, "posts", 1)]),
+        "reserve_post_ids": reserve_post_ids(len(post_ids)),
+        "create_posts": insert_posts(post_ids, batch, owner_id)[0],
+        "post_owner": select_post_owner(post_id),
+        "update_post": replace_post(post_id, post),
+        "list_posts": select_page(10, 0, None, None),
+        "page_posts": select_page(10, 0, None, encode_cursor(created_at, post_id)),
+        # A rare term, common ones match so much of the table that scanning it is right.
+        "search_posts": select_page(10, 0, "zeppelin", None),
+        "search_page": select_page(10, 0, "zeppelin", encode_cursor(0.1, created_at, post_id)),
+        **{
+            f"{sort.value}_feed": select_feed(sort, 10, None)
+            for sort in FeedSort
+        },
+        **{
+            f"{sort.value}_feed_page": select_feed(sort, 10, feed_cursors[sort])
+            for sort in FeedSort
+        },
+        "export_owner": select_export(owner_id, None, None, None, 0),
+        "delete_post": select_deleted_post(post_id),
+        "post_voters": select_voters(post_id),
+        "user_posts": select(Post.id).where(Post.owner_id == owner_id),
+        "add_vote": count_votes(insert_votes(voter_id, [post_id]), 1),
+        "add_votes": count_votes(insert_votes(voter_id, post_ids), 1),
+        "existing_posts": select_existing_posts(post_ids),
+        "delete_vote": count_votes(delete_votes(voter_id, [post_id]), -1),
+        "vote_stats": vote_stats(voter_id, [owner_id], 1),
+        "recount_posts": recount_posts(select(literal(post_id))),
+        "recount_stats": recount_stats(select(literal(owner_id))),
+    }
+
+
+def nodes(plan: dict) -> Iterator[dict]:
+    """ Yields every node of an EXPLAIN plan tree. """
+
+    yield plan
+
+    for child in plan.get("Plans", []):
+        yield from nodes(child)
+
+
+def explain(db: Session, statement: Executable) -> dict:
+    """ Returns the estimated plan of a statement, without running it. """
+
+    connection = db.connection()
+    compiled = statement.compile(
+        dialect=connection.dialect, compile_kwargs={"render_postcompile": True}
+    )
+
+    return connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    ).scalar()[0]["Plan"]
+
+
+def check(db: Session, statements: Dict[str, Executable]) -> Dict[str, dict]:
+    """ Finds the sequential scans in the plan of each statement, flags those of INDEXED_TABLES.
+
+    Sequential scans are disabled for the transaction, so the planner only falls back to one
+    when no index can serve the statement, whatever the size of the table.
+    """
+
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+    report = {}
+
+    for name, statement in statements.items():
+        plan = explain(db, statement)
+        scans: List[str] = sorted({
+            node["Relation Name"] for node in nodes(plan) if node["Node Type"] == "Seq Scan"
+        })
+
+        report[name] = {
+            "cost": plan["Total Cost"],
+            "seq_scans": scans,
+            "regressed": not INDEXED_TABLES.isdisjoint(scans),
+        }
+
+    return report
+
+
+def main() -> None:
+    """ Explains every query against the database, fails on sequential scans of posts or votes. """
+
+    parser = ArgumentParser(prog="python -m benchmarks.plans")
+    parser.add_argument("--queries", nargs="+", help="only explain these queries")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        statements = queries(sample(db))
+
+        if args.queries:
+            statements = {name: statements[name] for name in args.queries}
+
+        report = check(db, statements)
+        db.rollback()
+
+    print(json.dumps(report, indent=2))
+
+    # Fail the run when a query scans posts or votes, so it can gate a migration or a deploy.
+    if any(query["regressed"] for query in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
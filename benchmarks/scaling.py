@@ -0,0 +1,64 @@
+from .common import server
+from .load import load, prepare, REQUIRES, ROUTES
+
+from argparse import ArgumentParser
+
+import json
+import os
+
+
+def main() -> None:
+    """ Loads the server at increasing worker counts, reports how throughput scales. """
+
+    cores = os.cpu_count() or 1
+
+    parser = ArgumentParser(prog="python -m benchmarks.scaling")
+    parser.add_argument(
+        "--routes", nargs="+", choices=[route for route in ROUTES if route not in REQUIRES],
+        default=["get_user", "list_posts", "get_post"]
+    )
+    parser.add_argument(
+        "--server-workers", nargs="+", type=int,
+        default=sorted({1, *(n for n in (2, 4, 8, 16) if n < cores), cores})
+    )
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight per client")
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+
+    context = prepare(args.users)
+    runs = {}
+
+    for workers in args.server_workers:
+        with server(args.port, "--workers", str(workers)) as base_url:
+            runs[workers] = load(
+                context, args.routes, args.requests, args.concurrency, args.clients, base_url
+            )
+
+    # Efficiency is the throughput per worker relative to a single worker, 1.0 is linear.
+    first = args.server_workers[0]
+    report = {
+        "cores": cores,
+        "routes": {
+            route: {
+                workers: {
+                    "throughput": runs[workers][route]["throughput"],
+                    "p95": runs[workers][route]["p95"],
+                    "efficiency": round(
+                        runs[workers][route]["throughput"] * first
+                        / (runs[first][route]["throughput"] * workers), 2
+                    ),
+                }
+                for workers in args.server_workers
+            }
+            for route in args.routes
+        },
+    }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
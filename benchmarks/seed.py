@@ -0,0 +1,188 @@
+from app.database.database import get_engine, SessionLocal
+from app.libs.importer import CsvStream
+from app.libs.ranking import rescore_posts
+from app.libs.stats import rebuild_stats
+from app.libs.utils import hash
+from .common import BENCH_PASSWORD
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import Iterable, Iterator, Sequence
+from uuid import uuid4
+
+import json
+import random
+
+
+WORDS = (
+    "api async benchmark cache cats cursor database dogs fastapi index json latency "
+    "migration orm pagination performance pool postgres python query replica schema "
+    "search server sql throughput token vote worker"
+).split()
+
+
+def copy_rows(table: str, columns: Sequence[str], rows: Iterable[Sequence[object]]) -> float:
+    """ Streams rows into a table with COPY, returns the seconds it took. """
+
+    start = perf_counter()
+    connection = get_engine().raw_connection()
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                CsvStream(rows)
+            )
+
+        connection.commit()
+
+    finally:
+        connection.close()
+
+    return perf_counter() - start
+
+
+def next_ids(table: str) -> int:
+    """ Returns the first id after the rows already in a table. """
+
+    with get_engine().connect() as connection:
+        return connection.exec_driver_sql(f"SELECT coalesce(max(id), 0) + 1 FROM {table}").scalar()
+
+
+def sync_sequence(table: str) -> None:
+    """ Moves a table's id sequence past the ids written by COPY. """
+
+    with get_engine().begin() as connection:
+        connection.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT coalesce(max(id), 1) FROM {table}))"
+        )
+
+
+def recount_votes(post_ids: range) -> float:
+    """ Sets the counters of the seeded posts from the copied votes, returns the seconds it took. """
+
+    start = perf_counter()
+
+    # One grouped pass over the votes, instead of a count per post.
+    with get_engine().begin() as connection:
+        connection.exec_driver_sql(
+            "UPDATE posts SET votes = counted.votes FROM ("
+            "SELECT post_id, count(*) AS votes FROM votes "
+            "WHERE post_id BETWEEN %(first)s AND %(last)s GROUP BY post_id"
+            ") AS counted WHERE posts.id = counted.post_id",
+            {"first": post_ids.start, "last": post_ids.stop - 1}
+        )
+
+    return perf_counter() - start
+
+
+def user_rows(first_id: int, count: int, password: str) -> Iterator[tuple]:
+    prefix = uuid4().hex[:8]
+    now = datetime.now(timezone.utc)
+
+    for id in range(first_id, first_id + count):
+        yield id, f"seed-{prefix}-{id}@example.com", password, now.isoformat()
+
+
+def post_rows(first_id: int, count: int, user_ids: range, rng: random.Random) -> Iterator[tuple]:
+    now = datetime.now(timezone.utc)
+
+    for id in range(first_id, first_id + count):
+        title = " ".join(rng.choices(WORDS, k=4))
+        content = " ".join(rng.choices(WORDS, k=rng.randint(10, 60)))
+        created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+
+        yield id, title, content, rng.random() < 0.9, created_at.isoformat(), \
+            rng.choice(user_ids)
+
+
+def vote_rows(count: int, user_ids: range, post_ids: range, rng: random.Random) -> Iterator[tuple]:
+    per_user, remainder = divmod(count, len(user_ids))
+
+    # Each user votes on distinct posts, so the (user_id, post_id) key never repeats.
+    for offset, user_id in enumerate(user_ids):
+        votes = min(per_user + (offset < remainder), len(post_ids))
+
+        for post_id in rng.sample(post_ids, votes):
+            yield user_id, post_id
+
+
+def seed(users: int, posts: int, votes: int, random_seed: int) -> dict:
+    """ Bulk loads users, posts and votes, returns the seconds each step took. """
+
+    rng = random.Random(random_seed)
+    timings = {}
+
+    first_user = next_ids("users")
+    user_ids = range(first_user, first_user + users)
+    timings["users"] = copy_rows(
+        "users", ("id", "email", "password", "created_at"),
+        user_rows(first_user, users, hash(BENCH_PASSWORD))
+    )
+    sync_sequence("users")
+
+    first_post = next_ids("posts")
+    post_ids = range(first_post, first_post + posts)
+    timings["posts"] = copy_rows(
+        "posts", ("id", "title", "content", "published", "created_at", "owner_id"),
+        post_rows(first_post, posts, user_ids, rng)
+    )
+    sync_sequence("posts")
+
+    if votes and posts:
+        timings["votes"] = copy_rows(
+            "votes", ("user_id", "post_id"), vote_rows(votes, user_ids, post_ids, rng)
+        )
+
+        timings["recount"] = recount_votes(post_ids)
+
+    # COPY leaves every post with the score of a new one, score them by their real age.
+    start = perf_counter()
+
+    with SessionLocal() as db:
+        rescore_posts(db, after_id=first_post - 1)
+
+    timings["rescore"] = perf_counter() - start
+
+    # COPY bypasses the incremental upkeep of the profile stats as well.
+    start = perf_counter()
+
+    with SessionLocal() as db:
+        rebuild_stats(db)
+
+    timings["stats"] = perf_counter() - start
+
+    start = perf_counter()
+
+    with get_engine().connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql(
+            "ANALYZE users, posts, votes, user_stats"
+        )
+
+    timings["analyze"] = perf_counter() - start
+
+    return {step: round(seconds, 2) for step, seconds in timings.items()}
+
+
+def main() -> None:
+    """ Seeds the configured database with synthetic users, posts and votes. """
+
+    parser = ArgumentParser(prog="python -m benchmarks.seed")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--votes", type=int, default=500000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.posts and not args.users:
+        parser.error("posts need at least one user to own them")
+
+    timings = seed(args.users, args.posts, args.votes, args.seed)
+
+    print(json.dumps({"rows": vars(args), "seconds": timings}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from .common import server
+
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+ROOT = Path(__file__).resolve().parents[1]
+REQUIRED_SETTINGS = ("DATABASE_", "SECRET_KEY", "ALGORITHM", "ACCESS_TOKEN_")
+
+# Each phase runs in a fresh interpreter, since a second import would hit the module cache.
+IMPORT_ONLY = """
+import json, time
+start = time.perf_counter()
+import app.main
+print(json.dumps({"import": time.perf_counter() - start}))
+"""
+
+STARTUP = """
+import asyncio, json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+application = app.main.create_app()
+created = time.perf_counter()
+
+async def cycle():
+    async with application.router.lifespan_context(application):
+        started = time.perf_counter()
+
+    return started, time.perf_counter()
+
+started, stopped = asyncio.run(cycle())
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "lifespan_startup": started - created,
+    "lifespan_shutdown": stopped - started,
+}))
+"""
+
+
+def run_snippet(code: str, env: Dict[str, str], cwd: Optional[str] = None) -> Dict[str, float]:
+    """ Runs a snippet in a new interpreter, returns the timings it printed. """
+
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, cwd=cwd, capture_output=True, text=True, check=True
+    ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+def medians(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    """ Returns the median of each timing, in milliseconds. """
+
+    return {
+        name: round(statistics.median(sample[name] for sample in samples) * 1000, 2)
+        for name in samples[0]
+    }
+
+
+def unconfigured_env() -> Dict[str, str]:
+    """ Returns the environment without any application setting, to prove imports read none. """
+
+    env = {
+        key: value for key, value in os.environ.items()
+        if not key.upper().startswith(REQUIRED_SETTINGS)
+    }
+    env["PYTHONPATH"] = str(ROOT)
+
+    return env
+
+
+def time_to_serve(port: int) -> float:
+    """ Returns the seconds from starting a uvicorn process until it answers a request. """
+
+    start = perf_counter()
+
+    with server(port):
+        return perf_counter() - start
+
+
+def main() -> None:
+    """ Measures import, app creation, lifespan and time to first response of the app. """
+
+    parser = ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+
+    # Import from outside the repository without settings, so neither .env nor the
+    # environment is read at import time.
+    with tempfile.TemporaryDirectory() as empty:
+        unconfigured = medians(
+            [run_snippet(IMPORT_ONLY, unconfigured_env(), empty) for _ in range(args.runs)]
+        )
+
+    startup = medians([run_snippet(STARTUP, env) for _ in range(args.runs)])
+    serve = round(statistics.median(time_to_serve(args.port) for _ in range(args.runs)) * 1000, 2)
+
+    print(json.dumps({
+        "runs": args.runs,
+        "unconfigured_import": unconfigured["import"],
+        **startup,
+        "time_to_first_response": serve,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
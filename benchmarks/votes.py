@@ -0,0 +1,61 @@
+from app.database.config import settings
+from app.database.database import SessionLocal
+from app.database.models import Post
+from app.libs.counters import vote_counters
+from .common import auth_headers, create_post, create_users, make_client, run
+
+from argparse import ArgumentParser
+
+import asyncio
+import json
+
+
+async def hot_post(users: int, concurrency: int, write_behind: bool) -> dict:
+    """ Casts one vote per user on a single post, returns the summary. """
+
+    settings.vote_write_behind = write_behind
+    user_ids = create_users(users)
+    post_id = create_post(user_ids[0])
+
+    if write_behind:
+        vote_counters.start()
+
+    async with make_client() as client:
+        summary = await run(
+            (
+                lambda headers=auth_headers(user_id): client.post(
+                    "/votes/", json={"post_id": post_id}, headers=headers
+                )
+                for user_id in user_ids
+            ),
+            concurrency
+        )
+
+    vote_counters.stop()
+
+    with SessionLocal() as db:
+        summary["votes"] = db.get(Post, post_id).votes
+
+    summary["write_behind"] = write_behind
+
+    return summary
+
+
+def main() -> None:
+    """ Benchmarks votes per second on one hot post, with write-behind off and on. """
+
+    parser = ArgumentParser(prog="python -m benchmarks.votes")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(hot_post(args.users, args.concurrency, write_behind))
+        for write_behind in (False, True)
+    ]
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
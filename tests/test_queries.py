@@ -0,0 +1,70 @@
+from app.database.database import get_engine, SessionLocal
+from app.database.models import Post, User, Vote
+from app.libs.profiler import query_budget
+from app.main import create_app
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert, update
+from typing import Iterator
+from uuid import uuid4
+
+import pytest
+
+
+# A page is read in one statement whatever its size, owners and vote counts included.
+PAGE_BUDGET = 1
+
+
+@pytest.fixture(scope="module")
+def client() -> Iterator[TestClient]:
+    with TestClient(create_app()) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def posts() -> Iterator[None]:
+    """ Adds 100 of the newest posts, by several owners, with votes on every post. """
+
+    prefix = uuid4().hex[:8]
+
+    with SessionLocal() as db:
+        user_ids = db.scalars(
+            insert(User).returning(User.id),
+            [{"email": f"queries-{prefix}-{i}@example.com", "password": "-"} for i in range(5)]
+        ).all()
+        post_ids = db.scalars(
+            insert(Post).returning(Post.id),
+            [
+                {"title": f"Post {i}", "content": "Query count.", "owner_id": user_ids[i % 5]}
+                for i in range(100)
+            ]
+        ).all()
+        db.execute(insert(Vote), [
+            {"user_id": user_id, "post_id": post_id}
+            for post_id in post_ids for user_id in user_ids[:2]
+        ])
+        db.execute(update(Post).where(Post.id.in_(post_ids)).values(votes=2))
+        db.commit()
+
+    yield
+
+    with SessionLocal() as db:
+        db.execute(delete(User).where(User.id.in_(user_ids)))
+        db.commit()
+
+
+@pytest.mark.parametrize("path", ["/posts/", "/posts/feed?sort=new"])
+def test_page_query_count_is_constant(client: TestClient, posts: None, path: str) -> None:
+    counts = []
+
+    for limit in (1, 10, 100):
+        with query_budget(PAGE_BUDGET, get_engine()) as budget:
+            response = client.get(path, params={"limit": limit})
+
+        assert response.status_code == 200
+        assert len(response.json()) == limit
+        assert all(post["owner"]["email"] and post["votes"] == 2 for post in response.json())
+
+        counts.append(budget.count)
+
+    assert len(set(counts)) == 1, counts
@@ -0,0 +1,37 @@
+from app.database.database import SessionLocal
+from benchmarks.plans import check, queries, sample
+
+from typing import Dict
+
+import pytest
+
+
+# Named here rather than built at collection, since building the statements reads the settings.
+QUERY_NAMES = [
+    "login", "get_user", "user_profile", "user_version", "get_post", "post_version",
+    "create_post", "post_stats", "reserve_post_ids", "create_posts", "post_owner", "update_post",
+    "list_posts", "page_posts", "search_posts", "search_page", "hot_feed", "top_feed", "new_feed",
+    "hot_feed_page", "top_feed_page", "new_feed_page", "export_owner", "delete_post",
+    "post_voters", "user_posts", "add_vote", "add_votes", "existing_posts", "delete_vote",
+    "vote_stats", "recount_posts", "recount_stats",
+]
+
+
+@pytest.fixture(scope="module")
+def report() -> Dict[str, dict]:
+    """ Explains every query against the test database, with sequential scans disabled. """
+
+    with SessionLocal() as db:
+        report = check(db, queries(sample(db)))
+        db.rollback()
+
+    return report
+
+
+def test_every_query_is_checked(report: Dict[str, dict]) -> None:
+    assert sorted(report) == sorted(QUERY_NAMES)
+
+
+@pytest.mark.parametrize("name", QUERY_NAMES)
+def test_query_reads_posts_and_votes_through_indexes(report: Dict[str, dict], name: str) -> None:
+    assert not report[name]["regressed"], f"{name} scans {report[name]['seq_scans']} in full"
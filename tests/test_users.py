@@ -0,0 +1,50 @@
+from app.database.config import settings
+from app.database.database import SessionLocal
+from app.database.models import User
+from app.main import create_app
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert
+from typing import Iterator
+from uuid import uuid4
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def user_id() -> Iterator[int]:
+    """ Adds a user without a stats row, as rows loaded around the API may be. """
+
+    with SessionLocal() as db:
+        user_id = db.scalar(
+            insert(User).returning(User.id),
+            [{"email": f"users-{uuid4().hex[:8]}@example.com", "password": "-"}]
+        )
+        db.commit()
+
+    yield user_id
+
+    with SessionLocal() as db:
+        db.execute(delete(User).where(User.id == user_id))
+        db.commit()
+
+
+def get_profile(user_id: int, fast: bool, monkeypatch: pytest.MonkeyPatch) -> bytes:
+    monkeypatch.setattr(settings, "fast_serialization", fast)
+
+    with TestClient(create_app()) as client:
+        response = client.get(f"/users/{user_id}", params={"include_stats": True})
+
+    assert response.status_code == 200
+
+    return response.content
+
+
+def test_user_without_stats_has_zeroed_stats_in_both_modes(
+    user_id: int, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    default = get_profile(user_id, False, monkeypatch)
+    fast = get_profile(user_id, True, monkeypatch)
+
+    assert fast == default
+    assert b'"stats":{"posts":0,"votes_received":0,"votes_cast":0}' in fast